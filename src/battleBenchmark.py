@@ -0,0 +1,173 @@
+from components.battles import Battle
+from components.players import Players
+from components.quoteDeck import QuoteDeck
+from components.logging import loggingInstance
+
+from argparse import ArgumentParser
+from asyncio import run
+from datetime import datetime
+from random import Random
+from time import perf_counter
+import subprocess
+import tracemalloc
+import logging
+import json
+
+BENCHMARK_CATEGORIES = {
+    "High Rank Kill": 12,
+    "High XRAIN Kill": 12,
+    "Low XRAIN Kill": 12,
+    "Normal Kill": 20,
+    "Neutral": 30,
+    "Revival": 10,
+}
+
+
+class StubBattleRoyaleDB:
+    # In-memory stand-in for the one query QuoteDeck.refresh makes, no MySQL needed. Battles draw from the
+    # preloaded deck, so that path is what the benchmark measures
+    def __init__(self):
+        self.quotes = []
+        for category, count in BENCHMARK_CATEGORIES.items():
+            for number in range(count):
+                if category in ("Neutral", "Revival"):
+                    text = f"$Player1 {category.lower()} line {number}, nothing else happens to them"
+                else:
+                    text = f"$Player1 {category.lower()} line {number} and $Player2 falls to the forest floor"
+                self.quotes.append((len(self.quotes) + 1, category, text))
+
+    async def getAllQuotes(self):
+        return list(self.quotes)
+
+
+def buildBattle(quoteDeck: QuoteDeck, playerNum: int, seed: int) -> Battle:
+    rng = Random(seed)
+    battleInstance = Battle(quoteDeck, seed=seed)
+    for index in range(playerNum):
+        battleInstance.join(Players(
+            xrpId=f"r{index:033d}",
+            wager=50,
+            name=f"Warrior_{index}",
+            discordId=10**17 + index,
+            battleWins=rng.randint(0, 120),
+            tokenId=f"{index:064X}",
+            boosts=rng.randint(0, 3) if rng.random() < 0.3 else 0,
+            xrainPower=rng.randint(50, 5000),
+            store=battleInstance.store,
+        ))
+    return battleInstance
+
+
+async def runBattle(battleInstance: Battle) -> tuple[list[float], int]:
+    roundTimes = []
+    engagements = 0
+    while True:
+        start = perf_counter()
+        battleResults = await battleInstance.battle()
+        roundTimes.append(perf_counter() - start)
+        engagements += len(battleResults['quotes'])
+        if battleResults['winner'] is not None:
+            return roundTimes, engagements
+
+
+def percentile(values: list[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+async def benchmarkSize(quoteDeck: QuoteDeck, playerNum: int, budget: float, minBattles: int, seed: int) -> dict:
+    # Peak memory comes from a separate traced battle so tracing does not skew the timings
+    tracemalloc.start()
+    await runBattle(buildBattle(quoteDeck, playerNum, seed))
+    memoryPeak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    roundTimes = []
+    rounds = []
+    engagements = 0
+    battles = 0
+    elapsed = 0.0
+    while battles < minBattles or elapsed < budget:
+        battleInstance = buildBattle(quoteDeck, playerNum, seed + battles + 1)
+        start = perf_counter()
+        battleRoundTimes, battleEngagements = await runBattle(battleInstance)
+        elapsed += perf_counter() - start
+        roundTimes.extend(battleRoundTimes)
+        rounds.append(len(battleRoundTimes))
+        engagements += battleEngagements
+        battles += 1
+
+    return {
+        "players": playerNum,
+        "battles": battles,
+        "meanRounds": sum(rounds) / battles,
+        "maxRounds": max(rounds),
+        "engagementsPerBattle": engagements / battles,
+        "engagementsPerSecond": engagements / elapsed,
+        "battleSeconds": elapsed / battles,
+        "roundP50": percentile(roundTimes, 0.50),
+        "roundP95": percentile(roundTimes, 0.95),
+        "roundP99": percentile(roundTimes, 0.99),
+        "roundMax": max(roundTimes),
+        "memoryPeakBytes": memoryPeak,
+    }
+
+
+def gitCommit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def formatResult(result: dict, baseline: dict | None) -> str:
+    line = (f"{result['players']:>6} players | {result['battles']:>5} battles | {result['meanRounds']:6.1f} rounds | "
+            f"{result['engagementsPerSecond']:>10,.0f} eng/s | round p50 {result['roundP50'] * 1000:7.3f}ms "
+            f"p95 {result['roundP95'] * 1000:7.3f}ms p99 {result['roundP99'] * 1000:7.3f}ms | "
+            f"peak {result['memoryPeakBytes'] / 1024:8.1f} KiB")
+    if baseline:
+        change = result['engagementsPerSecond'] / baseline['engagementsPerSecond'] - 1
+        line += f" | eng/s {change * 100:+6.1f}% vs baseline"
+    return line
+
+
+async def main():
+    parser = ArgumentParser(description="Battle engine micro-benchmarks on a stub database")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2, 10, 50, 200, 1000])
+    parser.add_argument("--seconds", type=float, default=2.0, help="Time budget per size")
+    parser.add_argument("--min-battles", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="battle-benchmark.json", help="Machine-readable results")
+    parser.add_argument("--baseline", default=None, help="Earlier results file to compare against")
+    parser.add_argument("--with-logging", action="store_true", help="Keep the per-engagement log lines the bot writes")
+    args = parser.parse_args()
+
+    if not args.with_logging:
+        loggingInstance.setLevel(logging.WARNING)
+
+    quoteDeck = QuoteDeck(StubBattleRoyaleDB(), weights={}, refreshInterval=0)
+    await quoteDeck.refresh()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as baselineFile:
+            baseline = {result['players']: result for result in json.load(baselineFile)['results']}
+
+    results = []
+    for playerNum in args.sizes:
+        result = await benchmarkSize(quoteDeck, playerNum, args.seconds, args.min_battles, args.seed)
+        results.append(result)
+        print(formatResult(result, baseline.get(playerNum)))
+
+    with open(args.output, "w") as outputFile:
+        json.dump({
+            "commit": gitCommit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "seed": args.seed,
+            "withLogging": args.with_logging,
+            "results": results,
+        }, outputFile, indent=2)
+
+
+if __name__ == "__main__":
+    run(main())
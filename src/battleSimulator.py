@@ -0,0 +1,77 @@
+from components.config import gameConfig
+from components.simulator import BattleSimulator, SimulationRoster, SIM_CATEGORIES
+from components.quoteDeck import parseQuoteWeights
+from asyncio import run
+from argparse import ArgumentParser
+from collections import Counter
+import json
+
+parser = ArgumentParser(description="Monte Carlo odds for the XRAIN battle royale")
+parser.add_argument("--battles", type=int, default=100000, help="Number of simulated battles")
+parser.add_argument("--batch-size", type=int, default=4096, help="Battles simulated side by side")
+parser.add_argument("--players", type=int, default=50, help="Synthetic roster size when no DB roster is used")
+parser.add_argument("--xrp-ids", default="", help="Comma separated xrpIds to load from RewardsTable")
+parser.add_argument("--db-players", type=int, default=0, help="Load the top N players with a battle NFT from RewardsTable")
+parser.add_argument("--quotes-from-db", action="store_true", help="Use the BattleQuotes category mix instead of an even one")
+parser.add_argument("--weights", default=None, help='Category weights, e.g. "Neutral: 2, Revival: 0.5" (defaults to GAME quote_weights)')
+parser.add_argument("--max-revive", type=int, default=None, help="Defaults to GAME max_revive")
+parser.add_argument("--boost-multiplier", type=float, default=2, help="xrainPower multiplier for boosted players")
+parser.add_argument("--max-rounds", type=int, default=1000)
+parser.add_argument("--seed", type=int, default=None)
+parser.add_argument("--top", type=int, default=20, help="Players shown in the report")
+parser.add_argument("--json", default=None, help="Write the full report to this file")
+
+
+async def loadFromDB(args):
+    from database.db import BattleRoyaleDB
+
+    dbInstance = BattleRoyaleDB.fromConfig()
+
+    profiles = None
+    if args.xrp_ids or args.db_players:
+        xrpIds = [xrpId.strip() for xrpId in args.xrp_ids.split(",") if xrpId.strip()]
+        profiles = await dbInstance.getBattleProfiles(xrpIds=xrpIds or None, limit=args.db_players or None)
+
+    quoteCounts = None
+    if args.quotes_from_db:
+        quoteCounts = Counter(quoteType for _, quoteType, _ in await dbInstance.getAllQuotes())
+
+    await dbInstance.dbEngine.dispose()
+    return profiles, quoteCounts
+
+
+async def main():
+    args = parser.parse_args()
+
+    profiles, quoteCounts = (None, None)
+    if args.xrp_ids or args.db_players or args.quotes_from_db:
+        profiles, quoteCounts = await loadFromDB(args)
+
+    if profiles is not None:
+        roster = SimulationRoster.fromProfiles(profiles, boostMultiplier=args.boost_multiplier)
+    else:
+        roster = SimulationRoster.synthetic(args.players, seed=args.seed, boostMultiplier=args.boost_multiplier)
+
+    # Same weighting as QuoteDeck: quote counts per category, overridden by configured weights
+    categoryWeights = {category.lower(): 1 for category in SIM_CATEGORIES}
+    if quoteCounts is not None:
+        categoryWeights = {category.lower(): count for category, count in quoteCounts.items()}
+    categoryWeights.update(parseQuoteWeights(args.weights if args.weights is not None else gameConfig.get("quote_weights", fallback="")))
+
+    simulator = BattleSimulator(
+        roster,
+        categoryWeights,
+        maxRevive=args.max_revive if args.max_revive is not None else gameConfig.getint("max_revive"),
+        seed=args.seed,
+        maxRounds=args.max_rounds,
+    )
+    report = simulator.run(args.battles, batchSize=args.batch_size)
+    print(report.format(top=args.top))
+
+    if args.json:
+        with open(args.json, "w") as reportFile:
+            json.dump(report.asDict(), reportFile, indent=2)
+
+
+if __name__ == "__main__":
+    run(main())
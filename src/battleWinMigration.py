@@ -1,19 +1,71 @@
 from database.db import BattleRoyaleDB
-from components.config import dbConfig
 from asyncio import run
+from argparse import ArgumentParser
+from time import perf_counter
+import json
+import os
 
+parser = ArgumentParser(description="Copy battle wins from RewardsTable to NFTTraitList in resumable chunks")
+parser.add_argument("--chunk-size", type=int, default=1000, help="RewardsTable rows per transaction")
+parser.add_argument("--checkpoint", default="battle-wins-migration.json", help="Progress file used to resume")
+parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the first row")
+parser.add_argument("--dry-run", action="store_true", help="Only report the rows that would change")
+parser.add_argument("--show-differences", action="store_true", help="Print every tokenId whose battleWins differ")
 
-dbInstance = BattleRoyaleDB(
-    host=dbConfig["db_server"],
-    dbName=dbConfig["db_name"],
-    username=dbConfig["db_username"],
-    password=dbConfig["db_password"],
-    verbose=dbConfig.getboolean("verbose"),
-)
+
+def loadCheckpoint(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"lastXrpId": None, "rows": 0, "changed": 0, "missing": 0}
+
+    with open(path) as checkpointFile:
+        return json.load(checkpointFile)
+
+
+# Written to a temporary file first so a crash never leaves a half-written checkpoint
+def saveCheckpoint(path: str, checkpoint: dict):
+    with open(f"{path}.tmp", "w") as checkpointFile:
+        json.dump(checkpoint, checkpointFile)
+    os.replace(f"{path}.tmp", path)
 
 
 async def main():
-    await dbInstance.syncBattleWins()
+    args = parser.parse_args()
+
+    dbInstance = BattleRoyaleDB.fromConfig()
+
+    # Dry runs always scan everything and never move the checkpoint
+    if args.restart or args.dry_run:
+        checkpoint = {"lastXrpId": None, "rows": 0, "changed": 0, "missing": 0}
+    else:
+        checkpoint = loadCheckpoint(args.checkpoint)
+        if checkpoint["lastXrpId"] is not None:
+            print(f"Resuming after {checkpoint['lastXrpId']} ({checkpoint['rows']} rows already done)")
+
+    start = perf_counter()
+    rows = 0
+    async for chunk in dbInstance.syncBattleWinsChunks(
+        chunkSize=args.chunk_size, afterXrpId=checkpoint["lastXrpId"], dryRun=args.dry_run
+    ):
+        rows += chunk["rows"]
+        checkpoint["lastXrpId"] = chunk["lastXrpId"]
+        for key in ("rows", "changed", "missing"):
+            checkpoint[key] += chunk[key]
+
+        if not args.dry_run:
+            saveCheckpoint(args.checkpoint, checkpoint)
+
+        if args.show_differences:
+            for tokenId, currentWins, battleWins in chunk["differences"]:
+                print(f"  {tokenId}: {currentWins} -> {battleWins}")
+
+        elapsed = perf_counter() - start
+        print(f"{checkpoint['rows']:>9} rows | {checkpoint['changed']:>8} {'differ' if args.dry_run else 'updated'} | "
+              f"{checkpoint['missing']:>6} without NFTTraitList row | {rows / elapsed:8.0f} rows/s | up to {chunk['lastXrpId']}")
+
+    await dbInstance.dbEngine.dispose()
+    print(f"Done: {checkpoint['rows']} rows, {checkpoint['changed']} {'differ' if args.dry_run else 'updated'} "
+          f"in {perf_counter() - start:.1f}s")
 
 
-run(main())
+if __name__ == "__main__":
+    run(main())
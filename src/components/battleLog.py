@@ -0,0 +1,111 @@
+from components.quoteTemplates import QuoteTemplate, formatName
+
+from typing import NamedTuple
+from base64 import b64encode, b64decode
+from struct import Struct
+import zlib
+import json
+
+EVENT_CATEGORIES = ["High Rank Kill", "High XRAIN Kill", "Low XRAIN Kill", "Normal Kill", "Neutral", "Revival"]
+UNKNOWN_CATEGORY = 255
+NO_TARGET = 0xFFFF
+
+OUTCOME_NEUTRAL = 0
+OUTCOME_REVIVAL = 1
+OUTCOME_ACTOR_WINS = 2
+OUTCOME_TARGET_WINS = 3
+
+# round, actor, target, category, quoteId, outcome -> 12 bytes per engagement
+EVENT_STRUCT = Struct("<HHHBIB")
+
+categoryCodes = {category.lower(): code for code, category in enumerate(EVENT_CATEGORIES)}
+
+
+def categoryCode(category: str) -> int:
+    return categoryCodes.get(str(category).lower().strip(), UNKNOWN_CATEGORY)
+
+
+class BattleEvent(NamedTuple):
+    round: int
+    actor: int
+    target: int
+    category: int
+    quoteId: int
+    outcome: int
+
+
+# playerSlots holds each player's name already formatted by formatName()
+def renderEvent(event: BattleEvent, template: QuoteTemplate, playerSlots: list[str]) -> str:
+    if event.outcome == OUTCOME_NEUTRAL:
+        return template.render(playerSlots[event.actor], suffix="| :peace:")
+
+    if event.outcome == OUTCOME_REVIVAL:
+        return template.render(playerSlots[event.actor], suffix="| :innocent:")
+
+    # $Player1 is always the survivor and $Player2 the one who died
+    winner, loser = (event.actor, event.target) if event.outcome == OUTCOME_ACTOR_WINS else (event.target, event.actor)
+    return template.render(playerSlots[winner], playerSlots[loser], suffix="| :skull_crossbones:")
+
+
+class BattleLog:
+    def __init__(self, seed: int):
+        self.seed = seed
+        # name, battleWins, xrainPower, boosts: enough to rerun the battle from the seed
+        self.players: list[tuple[str, int, int, int]] = []
+        self.playerNames: list[str] = []
+        self.playerSlots: list[str] = []
+        self.events: list[BattleEvent] = []
+        # The text of every quote the battle used, so a replay does not depend on the quotes still in the DB
+        self.quotes: dict[int, str] = {}
+
+    def addPlayer(self, name: str, battleWins: int, xrainPower: int, boosts: int):
+        self.players.append((name, int(battleWins), int(xrainPower), int(boosts)))
+        self.playerNames.append(name)
+        self.playerSlots.append(formatName(name))
+
+    def append(self, event: BattleEvent, quoteDesc: str):
+        self.events.append(event)
+        if event.quoteId not in self.quotes:
+            self.quotes[event.quoteId] = quoteDesc
+
+    def packEvents(self) -> bytes:
+        return b"".join(EVENT_STRUCT.pack(*event) for event in self.events)
+
+    @staticmethod
+    def unpackEvents(packedEvents: bytes) -> list[BattleEvent]:
+        return [BattleEvent(*fields) for fields in EVENT_STRUCT.iter_unpack(packedEvents)]
+
+    def serialize(self) -> str:
+        return json.dumps({
+            "seed": self.seed,
+            "players": self.players,
+            "quotes": {str(quoteId): quoteDesc for quoteId, quoteDesc in self.quotes.items()},
+            "events": b64encode(zlib.compress(self.packEvents(), 9)).decode("ascii"),
+        }, separators=(",", ":"))
+
+    @classmethod
+    def deserialize(cls, serializedLog: str):
+        data = json.loads(serializedLog)
+        battleLog = cls(data["seed"])
+        for player in data["players"]:
+            battleLog.addPlayer(*player)
+        battleLog.quotes = {int(quoteId): quoteDesc for quoteId, quoteDesc in data["quotes"].items()}
+        battleLog.events = cls.unpackEvents(zlib.decompress(b64decode(data["events"])))
+        return battleLog
+
+
+# Rebuild every round's quote list from the log alone, with the quote texts stored in it
+def replayBattle(battleLog: BattleLog) -> list[list[str]]:
+    playerSlots = battleLog.playerSlots
+    templates = {quoteId: QuoteTemplate(quoteDesc) for quoteId, quoteDesc in battleLog.quotes.items()}
+    rounds: list[list[str]] = []
+
+    for event in battleLog.events:
+        if event.quoteId not in templates:
+            raise Exception("QuoteNotFound")
+
+        while len(rounds) < event.round:
+            rounds.append([])
+        rounds[event.round - 1].append(renderEvent(event, templates[event.quoteId], playerSlots))
+
+    return rounds
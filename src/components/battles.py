@@ -1,20 +1,108 @@
-from components.players import Players
+from components.players import Players, PlayerStore
 from components.config import gameConfig
-from random import randint
-from database.db import BattleRoyaleDB 
+from components.quoteDeck import QuoteDeck
+from components.battleLog import BattleLog, BattleEvent, renderEvent, categoryCode, NO_TARGET
+from components.battleLog import OUTCOME_NEUTRAL, OUTCOME_REVIVAL, OUTCOME_ACTOR_WINS, OUTCOME_TARGET_WINS
+from random import Random, SystemRandom
+from asyncio import sleep
 from components.logging import loggingInstance
 
+class IndexPool:
+    # Unordered set of player indices with O(1) add, remove and random pick (swap-remove)
+    def __init__(self, rng: Random, indices: list[int] | None = None):
+        self.rng = rng
+        self.items: list[int] = list(indices) if indices else []
+        self.positions: dict[int, int] = {index: position for position, index in enumerate(self.items)}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, index: int):
+        return index in self.positions
+
+    def add(self, index: int):
+        self.positions[index] = len(self.items)
+        self.items.append(index)
+
+    def remove(self, index: int):
+        position = self.positions.pop(index)
+        lastIndex = self.items.pop()
+        if lastIndex != index:
+            self.items[position] = lastIndex
+            self.positions[lastIndex] = position
+
+    def pick(self) -> int:
+        index = self.items[self.rng.randint(0, len(self.items)-1)]
+        self.remove(index)
+        return index
+
+
+class BattleRoster:
+    # Tracks who is alive/dead for the whole battle and who is still unvisited in the current round
+    def __init__(self, rng: Random):
+        self.rng = rng
+        self.alive = IndexPool(rng)
+        self.dead = IndexPool(rng)
+        self.aliveUnvisited = IndexPool(rng)
+        self.deadUnvisited = IndexPool(rng)
+
+    def add(self, index: int):
+        self.alive.add(index)
+
+    def startRound(self):
+        self.aliveUnvisited = IndexPool(self.rng, self.alive.items)
+        self.deadUnvisited = IndexPool(self.rng, self.dead.items)
+
+    def unvisitedCount(self) -> int:
+        return len(self.aliveUnvisited) + len(self.deadUnvisited)
+
+    # Any unvisited player, alive or dead, with equal odds
+    def pickUnvisited(self) -> int:
+        if self.rng.randint(0, self.unvisitedCount()-1) < len(self.aliveUnvisited):
+            return self.aliveUnvisited.pick()
+        return self.deadUnvisited.pick()
+
+    def pickAliveUnvisited(self) -> int:
+        return self.aliveUnvisited.pick()
+
+    def kill(self, index: int):
+        self.alive.remove(index)
+        self.dead.add(index)
+
+    def revive(self, index: int):
+        self.dead.remove(index)
+        self.alive.add(index)
+
+
 class Battle:
-    def __init__(self, dbInstance: BattleRoyaleDB):
+    def __init__(self, quoteDeck: QuoteDeck, seed: int | None = None):
         self.players: list[Players] = []
+        self.store = PlayerStore()
         self.totalWager = 0
-        self.dbInstance = dbInstance
+        self.quoteDeck = quoteDeck
         self.reviveBan = []
         self.currentAlive = []
         self.currentDead = []
+        # Every random decision goes through this RNG so the battle can be rerun from its seed
+        self.seed = seed if seed is not None else SystemRandom().getrandbits(63)
+        self.rng = Random(self.seed)
+        self.roster = BattleRoster(self.rng)
+        self.log = BattleLog(self.seed)
+        self.roundNumber = 0
         self.verbose = gameConfig.getboolean('verbose')
 
+    # Rebuild an archived battle with the same seed and roster; running it yields the same events
+    @classmethod
+    def fromLog(cls, battleLog: BattleLog, quoteDeck: QuoteDeck):
+        battleInstance = cls(quoteDeck, seed=battleLog.seed)
+        for index, (name, battleWins, xrainPower, boosts) in enumerate(battleLog.players):
+            battleInstance.join(Players(xrpId=str(index), wager=0, name=name, discordId=0, battleWins=battleWins,
+                                        tokenId="", boosts=boosts, xrainPower=xrainPower, store=battleInstance.store))
+        return battleInstance
+
     def join(self, player: Players):
+        self.roster.add(self.store.adopt(player))
+        self.log.addPlayer(player.name, player.battleWins, player.xrainPower, player.boosts)
         self.players.append(player)
         self.totalWager += player.wager
         self.currentAlive.append(player)
@@ -25,79 +113,51 @@ class Battle:
     def getBoostedList(self) -> list:
         return [players.name for players in self.players if players.boosts > 0]
     
-    # set Alive to true if you only want to return alive players
-    def __randomUniqueUser(self, alive=True) -> Players:
-        attempts = 0
-        maxAttempts = 100
-        while attempts < maxAttempts:
-            uniquePlayer = self.__randomUser()
-            
-            if uniquePlayer not in self.cycledPlayers:
-                if alive and not uniquePlayer.alive:
-                    continue  # Skip if we need an alive player but got a dead one
-                self.cycledPlayers.append(uniquePlayer)
-                if uniquePlayer.alive:
-                    self.cycledAlive.append(uniquePlayer)
-                return uniquePlayer
-            attempts += 1
-        raise Exception("PickUniquePlayerError")
-    
-    def __randomUser(self) -> Players:
-        return self.players[randint(0, len(self.players)-1)]
-    
     def getAlivePlayers(self):
         return [players for players in self.players if players.alive] 
     
     def getDeadPlayers(self):
         return [players for players in self.players if not players.alive] 
     
-    async def battle(self) -> dict:
-        returnBody = {'quotes': None,
-                      'alive': None,
-                      'winner': None,
-                      'deadNum': None,
-                      'participantsNum': None,
-                      'nftLinks': None}
+    # Resolves one round, yielding each engagement's quote as soon as it is decided
+    def engagements(self):
+        store = self.store
+        maxRevive = gameConfig.getint('max_revive')
         
-        # Function that does the battle system
+        # Every player gets visited once per round
+        self.roundNumber += 1
+        self.roster.startRound()
         
-        quotesList = []
-        
-        # List of players that we interacted with
-        self.cycledAlive = []
-        self.cycledPlayers = []
-        
-        while len(self.cycledPlayers) < len(self.players):
+        while self.roster.unvisitedCount():
             
             # Pick a player
-            playerOne = self.__randomUniqueUser(alive=False)
+            playerOneIndex = self.roster.pickUnvisited()
+            playerOneAlive = store.alive[playerOneIndex]
             
             # Roll for quote, include revival quotes if player is not alive
-            quoteCategory, quoteDescription = await self.dbInstance.getRandomQuote(revival=not playerOne.alive)
+            quote = self.quoteDeck.draw(revival=not playerOneAlive, rng=self.rng)
+            quoteCategory = quote.quoteType
             
-            if playerOne.alive == False:
+            if not playerOneAlive:
                 
                 if quoteCategory != "Revival":
                     continue
                 
-                if playerOne.boosts == 0:
+                if store.boosts[playerOneIndex] == 0:
                     continue
                 
-                if playerOne.reviveNum >= gameConfig.getint('max_revive'):
+                if store.reviveNum[playerOneIndex] >= maxRevive:
                     continue
                 
 
             # If there's no other players available for player 2, force neutral quote category, skip if revival
-            if len(self.cycledAlive) == len(self.currentAlive) and quoteCategory != 'Revival':
-                while quoteCategory != 'Neutral':
-                    quoteCategory, quoteDescription = await self.dbInstance.getRandomQuote()
-                    
+            if not len(self.roster.aliveUnvisited) and quoteCategory != 'Revival':
+                quote = self.quoteDeck.drawCategory('Neutral', rng=self.rng)
+                quoteCategory = quote.quoteType
             
+            playerTwoIndex = NO_TARGET
             if quoteCategory not in ['Neutral', "Revival"]:
-                playerTwo = self.__randomUniqueUser()
-            else:
-                # Replace the player name to the format if it is Neutral or Revival
-                quoteDescription:str = quoteDescription.replace("$Player1", f"**{playerOne.name}**")
+                playerTwoIndex = self.roster.pickAliveUnvisited()
             
             loggingInstance.info(f"Matching category: {quoteCategory}")
             
@@ -106,54 +166,72 @@ class Battle:
                 # Kill the lower wins
                 case "high rank kill":
                     loggingInstance.info("Matched: High Rank Kill")
-                    playerToKill = playerOne if playerOne.battleWins < playerTwo.battleWins else playerTwo
+                    indexToKill = playerOneIndex if store.battleWins[playerOneIndex] < store.battleWins[playerTwoIndex] else playerTwoIndex
                     
                 # Kill the lower power
                 case "high xrain kill":
                     loggingInstance.info("Matched: High XRAIN Kill")
-                    playerToKill = playerOne if playerOne.xrainPower < playerTwo.xrainPower else playerTwo
+                    indexToKill = playerOneIndex if store.xrainPower[playerOneIndex] < store.xrainPower[playerTwoIndex] else playerTwoIndex
                     
                 # Kill the higher power 
                 case "low xrain kill":
                     loggingInstance.info("Matched: Low XRAIN Kill")
-                    playerToKill = playerTwo if playerOne.xrainPower < playerTwo.xrainPower else playerOne
+                    indexToKill = playerTwoIndex if store.xrainPower[playerOneIndex] < store.xrainPower[playerTwoIndex] else playerOneIndex
                 
                 # Kill randomly
                 case "normal kill":
                     loggingInstance.info("Matched: Normal Kill")
-                    playerToKill = playerOne if randint(0,1) else playerTwo
+                    indexToKill = playerOneIndex if self.rng.randint(0,1) else playerTwoIndex
                 
                 # No one dies
                 case "neutral":
                     loggingInstance.info("Matched: Neutral")
-                    quoteDescription += "| :peace:"
-                    pass      
+                    outcome = OUTCOME_NEUTRAL
                 
                 case "revival":
                     loggingInstance.info("Matched: Revival")
-                    quoteDescription += "| :innocent:"
-                    playerOne.revive()  
+                    outcome = OUTCOME_REVIVAL
+                    store.revive(playerOneIndex)
+                    self.roster.revive(playerOneIndex)
                 
                 case _:
                     loggingInstance.error(f"Case Matching failed on [{str(quoteCategory).lower()}]")
-                    loggingInstance.error(f"wins: {'playerOne' if playerOne.battleWins < playerTwo.battleWins else 'playerTwo'}")
-                    loggingInstance.error(f"High: {'playerOne' if playerOne.xrainPower < playerTwo.xrainPower else 'playerTwo'}")
-                    loggingInstance.error(f"Low: {'playerTwo' if playerOne.xrainPower < playerTwo.xrainPower else 'playerOne'}")
+                    loggingInstance.error(f"wins: {'playerOne' if store.battleWins[playerOneIndex] < store.battleWins[playerTwoIndex] else 'playerTwo'}")
+                    loggingInstance.error(f"High: {'playerOne' if store.xrainPower[playerOneIndex] < store.xrainPower[playerTwoIndex] else 'playerTwo'}")
+                    loggingInstance.error(f"Low: {'playerTwo' if store.xrainPower[playerOneIndex] < store.xrainPower[playerTwoIndex] else 'playerOne'}")
 
             if quoteCategory not in ['Neutral', "Revival"]:
-                playerDead = playerOne if playerOne == playerToKill else playerTwo
-                playerAlive = playerOne if playerOne != playerToKill else playerTwo
-                playerDead.kill()
-                playerAlive.addKill()
-                quoteDescription = quoteDescription.replace("$Player2",f"**{playerDead.name}**")
-                quoteDescription = quoteDescription.replace("$Player1",f"**{playerAlive.name}**")
-                quoteDescription += "| :skull_crossbones:"
+                indexAlive = playerTwoIndex if indexToKill == playerOneIndex else playerOneIndex
+                store.kill(indexToKill)
+                self.roster.kill(indexToKill)
+                store.addKill(indexAlive)
+                outcome = OUTCOME_TARGET_WINS if indexToKill == playerOneIndex else OUTCOME_ACTOR_WINS
             
-            quotesList.append(quoteDescription)
+            event = BattleEvent(self.roundNumber, playerOneIndex, playerTwoIndex, categoryCode(quoteCategory), quote.quoteId, outcome)
+            self.log.append(event, quote.quoteDesc)
+            yield renderEvent(event, quote.template, self.log.playerSlots)
             
             
-        self.currentAlive = remainingAlive = self.getAlivePlayers()
-        self.currentDead = self.getDeadPlayers()
+        # Sorted so the alive list keeps join order, like the full scan did
+        self.currentAlive = [self.players[index] for index in sorted(self.roster.alive.items)]
+        self.currentDead = [self.players[index] for index in sorted(self.roster.dead.items)]
+    
+    # The loop gets control back between engagements, so a long round can be posted while it is still resolving
+    async def battleStream(self):
+        for quote in self.engagements():
+            yield quote
+            await sleep(0)
+    
+    # Round summary once the stream is exhausted
+    def roundResult(self, quotesList: list[str]) -> dict:
+        returnBody = {'quotes': None,
+                      'alive': None,
+                      'winner': None,
+                      'deadNum': None,
+                      'participantsNum': None,
+                      'nftLinks': None}
+        
+        remainingAlive = self.currentAlive
         
         returnBody['quotes'] = quotesList
         returnBody['alive'] = remainingAlive
@@ -162,4 +240,17 @@ class Battle:
         returnBody['participantsNum'] = len(remainingAlive)
         returnBody['nftLinks'] = [player.nftLink for player in remainingAlive]
         
-        return returnBody
\ No newline at end of file
+        return returnBody
+    
+    async def battle(self) -> dict:
+        return self.roundResult([quote async for quote in self.battleStream()])
+    
+    # Resolve whole rounds without posting anything until one player is left (bracket heats); the event
+    # loop gets control back after every round so a large bracket does not hold up the gateway
+    async def playOut(self) -> Players:
+        while True:
+            for _ in self.engagements():
+                pass
+            if len(self.currentAlive) == 1:
+                return self.currentAlive[0]
+            await sleep(0)
\ No newline at end of file
@@ -0,0 +1,68 @@
+from components.battles import Battle
+from components.players import Players, PlayerStore
+from components.quoteDeck import QuoteDeck
+from components.config import gameConfig
+from components.logging import loggingInstance
+
+from random import Random, SystemRandom
+from math import ceil
+
+
+class HeatResult:
+    def __init__(self, heatNumber: int, battleInstance: Battle, winner: Players):
+        self.heatNumber = heatNumber
+        self.battle = battleInstance
+        self.winner = winner
+        self.rounds = battleInstance.roundNumber
+        self.playerNum = len(battleInstance.players)
+
+
+class Bracket:
+    # Splits a big lobby into heats, resolves the heats one after another, each on its own Battle
+    # engine, and sends the heat winners to a final Battle
+    def __init__(self, quoteDeck: QuoteDeck, players: list[Players], heatSize: int | None = None, seed: int | None = None):
+        self.quoteDeck = quoteDeck
+        self.players = list(players)
+        self.heatSize = heatSize if heatSize is not None else gameConfig.getint('bracket_heat_size', fallback=50)
+        self.seed = seed if seed is not None else SystemRandom().getrandbits(63)
+        self.rng = Random(self.seed)
+        self.totalWager = sum(player.wager for player in self.players)
+        self.results: list[HeatResult] = []
+        self.final: Battle | None = None
+        self.verbose = gameConfig.getboolean('verbose')
+
+        # Heats differ in size by at most one player
+        heatCount = max(1, ceil(len(self.players) / self.heatSize))
+        shuffled = self.players[:]
+        self.rng.shuffle(shuffled)
+
+        self.heats: list[Battle] = [Battle(quoteDeck, seed=self.rng.getrandbits(63)) for _ in range(heatCount)]
+        for position, player in enumerate(shuffled):
+            self.heats[position % heatCount].join(player)
+
+    # Heats are pure Python, so threads would only contend for the GIL with the event loop; they run
+    # on the loop instead and playOut yields between rounds
+    async def runHeats(self) -> list[HeatResult]:
+        self.results = [
+            HeatResult(heatNumber, heat, await heat.playOut())
+            for heatNumber, heat in enumerate(self.heats, start=1)
+        ]
+
+        loggingInstance.info(f"Bracket {self.seed}: {len(self.heats)} heats resolved") if self.verbose else None
+        return self.results
+
+    # The final carries the whole lobby's pot so settlement stays on Battle.totalWager
+    def buildFinal(self) -> Battle:
+        self.final = Battle(self.quoteDeck, seed=self.rng.getrandbits(63))
+        for result in self.results:
+            self.final.join(result.winner)
+        self.final.totalWager = self.totalWager
+        return self.final
+
+    # Every entrant's stats in one store, for the end of battle leaderboards
+    def statsStore(self) -> tuple[PlayerStore, list[Players]]:
+        store = PlayerStore()
+        for player in self.players:
+            store.append(player.battleWins, player.boosts, player.xrainPower,
+                         player.alive, player.kills, player.deaths, player.reviveNum)
+        return store, self.players
@@ -0,0 +1,278 @@
+from components.config import gameConfig
+from components.logging import loggingInstance
+
+from asyncio import Semaphore, get_running_loop
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from time import perf_counter
+from typing import NamedTuple
+
+from PIL import Image
+
+
+# Pillow format name and file extension for each collage_format
+COLLAGE_FORMATS = {"webp": ("WEBP", "webp"), "jpeg": ("JPEG", "jpg"), "png": ("PNG", "png")}
+
+# Discord shows at most this many images (embeds or attachments) in one message
+MAX_COLLAGE_PARTS = 10
+
+
+class CollageResult(NamedTuple):
+    parts: list[bytes]
+    extension: str
+    width: int
+    height: int
+    scale: float
+    tiles: int
+    waitSeconds: float
+    composeSeconds: float
+    encodeSeconds: float
+
+    @property
+    def size(self) -> int:
+        return sum(len(part) for part in self.parts)
+
+
+def collageColumns(count: int) -> int:
+    possibleEntryPerRow = [1,2,3,4,5]
+    remainderResult = {}
+
+    for entry in possibleEntryPerRow:
+        currentRemainder = count % entry
+
+        if currentRemainder in remainderResult.keys():
+            currentEntry = remainderResult[currentRemainder]
+            remainderResult[currentRemainder] = currentEntry if currentEntry > entry else entry
+            continue
+
+        remainderResult[currentRemainder] = entry
+
+    sortedResultKey = list(remainderResult.keys())
+    sortedResultKey.sort()
+    minKey = sortedResultKey[0]
+    maxImagePerRow = remainderResult[minKey]
+    if maxImagePerRow == 1 and not count == 1:
+        maxImagePerRow = remainderResult[sortedResultKey[1]]
+    return maxImagePerRow
+
+
+class CollageAtlas:
+    # One battle's collage: every player's image is scaled once to the smallest image's size and the round
+    # canvas is patched as players fall instead of being rebuilt. deadTiles "grey" keeps the grid and greys
+    # out the fallen; "remove" blanks their cell and packs the survivors into a smaller grid once a whole
+    # row could be dropped. Rounds of one battle render one after another, so compose() needs no lock
+    def __init__(self, players: list, deadTiles: str | None = None):
+        self.players = [player for player in players if player is not None]
+        self.deadTiles = deadTiles if deadTiles is not None else gameConfig.get('collage_dead_tiles', fallback="remove")
+        self.order = {id(player): index for index, player in enumerate(self.players)}
+        self.tiles: dict[int, Image.Image] = {}
+        self.greyTiles: dict[int, Image.Image] = {}
+        self.tileWidth = 0
+        self.tileHeight = 0
+        self.columns = 0
+        self.rows = 0
+        self.cells: dict[int, int] = {}
+        self.shown: set[int] = set()
+        self.canvas: Image.Image | None = None
+        self.resizes = 0
+        self.layouts = 0
+        self.pastes = 0
+
+    def __build(self):
+        self.tileWidth = min(player.nftImage.width for player in self.players)
+        self.tileHeight = min(player.nftImage.height for player in self.players)
+        for player in self.players:
+            tile = player.nftImage
+            if tile.size != (self.tileWidth, self.tileHeight):
+                tile = tile.resize((self.tileWidth, self.tileHeight), Image.Resampling.LANCZOS)
+                self.resizes += 1
+            self.tiles[id(player)] = tile
+
+    def __greyTile(self, playerId: int) -> Image.Image:
+        tile = self.greyTiles.get(playerId)
+        if tile is None:
+            tile = self.greyTiles[playerId] = self.tiles[playerId].convert("L").point(lambda value: value // 2).convert("RGBA")
+        return tile
+
+    def __cellBox(self, cell: int) -> tuple[int, int, int, int]:
+        x = cell % self.columns * self.tileWidth
+        y = cell // self.columns * self.tileHeight
+        return x, y, x + self.tileWidth, y + self.tileHeight
+
+    def __paste(self, tile: Image.Image | tuple, cell: int):
+        self.canvas.paste(tile, self.__cellBox(cell))
+        self.pastes += 1
+
+    def __layout(self, playerIds: list[int]):
+        self.columns = collageColumns(len(playerIds))
+        self.rows = (len(playerIds) + self.columns - 1) // self.columns
+        self.canvas = Image.new('RGBA', (self.tileWidth * self.columns, self.tileHeight * self.rows), (0, 0, 0, 0))
+        self.cells = {playerId: cell for cell, playerId in enumerate(playerIds)}
+        for playerId, cell in self.cells.items():
+            self.__paste(self.tiles[playerId], cell)
+        self.shown = set(playerIds)
+        self.layouts += 1
+
+    def compose(self, alive: list) -> Image.Image:
+        if not self.tiles:
+            self.__build()
+
+        aliveIds = sorted((id(player) for player in alive if id(player) in self.tiles), key=self.order.__getitem__)
+        if self.canvas is None:
+            self.__layout(aliveIds if self.deadTiles == "remove" else [id(player) for player in self.players])
+
+        aliveSet = set(aliveIds)
+        fallen = self.shown - aliveSet
+        returning = aliveSet - self.shown
+
+        # A revived player who lost their cell in an earlier repack also needs a new layout
+        if self.deadTiles == "remove" and aliveIds and (
+            len(aliveIds) <= self.columns * (self.rows - 1) or any(playerId not in self.cells for playerId in returning)
+        ):
+            self.__layout(aliveIds)
+            return self.canvas
+
+        for playerId in fallen:
+            self.__paste(self.__greyTile(playerId) if self.deadTiles == "grey" else (0, 0, 0, 0), self.cells[playerId])
+        for playerId in returning:
+            self.__paste(self.tiles[playerId], self.cells[playerId])
+
+        self.shown = aliveSet
+        return self.canvas
+
+
+class CollageEncoder:
+    # Encodes a collage for upload: collages taller than rowsPerImage tile rows are cut into several images
+    # along row boundaries, each image is scaled to fit maxDimension and then scaled down further, a few
+    # times at most, until the images together fit in maxBytes
+    def __init__(self, outputFormat: str | None = None, quality: int | None = None, maxDimension: int | None = None,
+                 maxBytes: int | None = None, rowsPerImage: int | None = None):
+        outputFormat = (outputFormat if outputFormat is not None else gameConfig.get('collage_format', fallback="webp")).lower()
+        if outputFormat not in COLLAGE_FORMATS:
+            raise Exception("UnsupportedCollageFormat")
+        self.format, self.extension = COLLAGE_FORMATS[outputFormat]
+        self.quality = quality if quality is not None else gameConfig.getint('collage_quality', fallback=80)
+        self.maxDimension = maxDimension if maxDimension is not None else gameConfig.getint('collage_max_dimension', fallback=4096)
+        self.maxBytes = maxBytes if maxBytes is not None else gameConfig.getint('collage_max_bytes', fallback=8_000_000)
+        self.rowsPerImage = rowsPerImage if rowsPerImage is not None else gameConfig.getint('collage_rows_per_image', fallback=10)
+        self.maxAttempts = 5
+        self.minScale = 0.1
+
+    def __save(self, image: Image.Image) -> bytes:
+        with BytesIO() as image_binary:
+            if self.format == "JPEG":
+                # JPEG has no alpha, so blank cells become black
+                flattened = Image.new("RGB", image.size, (0, 0, 0))
+                flattened.paste(image, mask=image.getchannel("A") if image.mode == "RGBA" else None)
+                flattened.save(image_binary, "JPEG", quality=self.quality, optimize=True)
+            elif self.format == "WEBP":
+                image.save(image_binary, "WEBP", quality=self.quality, method=4)
+            else:
+                image.save(image_binary, "PNG", optimize=True)
+            return image_binary.getvalue()
+
+    def split(self, collage: Image.Image, rowHeight: int) -> list[Image.Image]:
+        if self.rowsPerImage <= 0 or rowHeight <= 0 or collage.height <= rowHeight * self.rowsPerImage:
+            return [collage]
+
+        # Keep to Discord's image count by putting more rows in each image when needed
+        rows = (collage.height + rowHeight - 1) // rowHeight
+        rowsPerImage = max(self.rowsPerImage, (rows + MAX_COLLAGE_PARTS - 1) // MAX_COLLAGE_PARTS)
+        bandHeight = rowHeight * rowsPerImage
+        return [collage.crop((0, top, collage.width, min(top + bandHeight, collage.height)))
+                for top in range(0, collage.height, bandHeight)]
+
+    def __scaled(self, images: list[Image.Image], scale: float) -> list[bytes]:
+        parts = []
+        for image in images:
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            parts.append(self.__save(image if size == image.size else image.resize(size, Image.Resampling.LANCZOS)))
+        return parts
+
+    def encode(self, collage: Image.Image, rowHeight: int = 0) -> tuple[list[bytes], float]:
+        images = self.split(collage, rowHeight)
+        scale = min(1.0, self.maxDimension / max(max(image.size) for image in images))
+
+        for attempt in range(self.maxAttempts):
+            parts = self.__scaled(images, scale)
+            size = sum(len(part) for part in parts)
+            if size <= self.maxBytes or scale <= self.minScale or attempt == self.maxAttempts - 1:
+                break
+            # Encoded size follows the pixel count, so the side shrinks with the square root, with a margin
+            scale = max(self.minScale, scale * min(0.9, (self.maxBytes / size) ** 0.5 * 0.95))
+
+        if size > self.maxBytes:
+            loggingInstance.error(f"Collage still {size / 1048576:.1f} MB at {scale:.0%} scale, over the {self.maxBytes / 1048576:.1f} MB budget")
+        return parts, scale
+
+
+class CollageRenderer:
+    # Composes and encodes round collages on worker threads (Pillow releases the GIL while resizing and
+    # encoding) so a 50 player collage no longer blocks the gateway heartbeat. At most workers + queueSize
+    # renders are accepted at once; further callers wait for a slot instead of piling up work
+    def __init__(self, workers: int | None = None, queueSize: int | None = None, encoder: CollageEncoder | None = None):
+        self.encoder = encoder if encoder is not None else CollageEncoder()
+        self.workers = workers if workers is not None else gameConfig.getint('collage_workers', fallback=2)
+        self.queueSize = queueSize if queueSize is not None else gameConfig.getint('collage_queue_size', fallback=8)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="collage")
+        self.slots = Semaphore(self.workers + self.queueSize)
+        self.pending = 0
+        self.waiting = 0
+        self.renders = 0
+        self.failures = 0
+        self.recent: deque[CollageResult] = deque(maxlen=100)
+
+    # The encoder may cut the collage at any multiple of the atlas's tile height
+    def __renderJob(self, atlas: CollageAtlas, alive: list) -> tuple[list[bytes], int, int, float, float, float]:
+        start = perf_counter()
+        collage = atlas.compose(alive)
+        composed = perf_counter()
+        parts, scale = self.encoder.encode(collage, atlas.tileHeight)
+        return parts, collage.width, collage.height, scale, composed - start, perf_counter() - composed
+
+    # The atlas is patched on the worker thread, so the next round of the battle must await this one first
+    async def renderRound(self, atlas: CollageAtlas, alive: list, label: str = "") -> CollageResult:
+        tiles = len(alive)
+        start = perf_counter()
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.pending += 1
+        try:
+            waitSeconds = perf_counter() - start
+            parts, width, height, scale, composeSeconds, encodeSeconds = await get_running_loop().run_in_executor(self.executor, self.__renderJob, atlas, alive)
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self.pending -= 1
+            self.slots.release()
+
+        result = CollageResult(parts, self.encoder.extension, width, height, scale, tiles, waitSeconds, composeSeconds, encodeSeconds)
+        self.renders += 1
+        self.recent.append(result)
+        # Upload size and encode time are what decide whether a round's post is slow, so they are always logged
+        loggingInstance.info(f"Collage {label}: {tiles} tiles {width}x{height} at {scale:.0%}, {len(parts)} {self.encoder.extension} "
+                             f"{'image' if len(parts) == 1 else 'images'} {result.size / 1024:.0f} KB, queued {waitSeconds * 1000:.0f}ms, compose {composeSeconds * 1000:.0f}ms, "
+                             f"encode {encodeSeconds * 1000:.0f}ms")
+        return result
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        renderTimes = sorted(result.composeSeconds + result.encodeSeconds for result in self.recent)
+        return {
+            "renders": self.renders,
+            "failures": self.failures,
+            "running": min(self.pending, self.workers),
+            "queued": max(self.pending - self.workers, 0) + self.waiting,
+            "p50RenderMs": renderTimes[len(renderTimes) // 2] * 1000 if renderTimes else 0.0,
+            "maxRenderMs": renderTimes[-1] * 1000 if renderTimes else 0.0,
+            "maxWaitMs": max((result.waitSeconds for result in self.recent), default=0.0) * 1000,
+            "maxUploadKB": max((result.size for result in self.recent), default=0) / 1024,
+        }
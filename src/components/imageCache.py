@@ -0,0 +1,298 @@
+from components.config import botConfig
+from components.logging import loggingInstance
+from components.imageFetcher import FetchResult, ImageFetcher
+
+from asyncio import CancelledError, Lock, Task, create_task, shield, sleep, to_thread
+from collections import OrderedDict
+from hashlib import sha256
+from io import BytesIO
+from time import time
+import json
+import os
+
+from PIL import Image
+
+
+class ImageCache:
+    # NFT artwork on disk, addressed by the sha256 of its bytes: the original plus a thumbnail no larger than
+    # thumbnailSize, which is what the collages use. links maps each nftLink to the content hash with its ETag
+    # and Last-Modified. Files are evicted least recently used first once they take more than maxBytes, and
+    # the most recent thumbnails also stay decoded in memory. A link older than revalidateAfter seconds is
+    # served from the cache and revalidated in the background with a conditional request
+    def __init__(self, fetcher: ImageFetcher, directory: str | None = None, maxBytes: int | None = None,
+                 thumbnailSize: int | None = None, revalidateAfter: float | None = None, memoryEntries: int | None = None):
+        self.fetcher = fetcher
+        self.directory = directory if directory is not None else botConfig.get('image_cache_dir', fallback="imageCache")
+        self.maxBytes = maxBytes if maxBytes is not None else botConfig.getint('image_cache_max_mb', fallback=512) * 1024 * 1024
+        self.thumbnailSize = thumbnailSize if thumbnailSize is not None else botConfig.getint('image_thumbnail_size', fallback=256)
+        self.revalidateAfter = revalidateAfter if revalidateAfter is not None else botConfig.getfloat('image_cache_revalidate', fallback=86400)
+        self.memoryEntries = memoryEntries if memoryEntries is not None else botConfig.getint('image_cache_memory_entries', fallback=512)
+        self.links: dict[str, dict] = {}
+        self.files: OrderedDict[str, int] = OrderedDict()
+        self.totalBytes = 0
+        self.thumbnails: OrderedDict[str, Image.Image] = OrderedDict()
+        self.inFlight: dict[str, Task] = {}
+        self.revalidating: dict[str, Task] = {}
+        self.loadLock = Lock()
+        self.loaded = False
+        self.saveTask: Task | None = None
+        self.memoryHits = 0
+        self.diskHits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.failures = 0
+        self.revalidated = 0
+        self.changed = 0
+        self.evictions = 0
+        self.verbose = botConfig.getboolean('verbose')
+
+    def __path(self, name: str) -> str:
+        return os.path.join(self.directory, name[:2], name)
+
+    def __thumbnailName(self, contentHash: str) -> str:
+        return f"{contentHash}.{self.thumbnailSize}.png"
+
+    # Every file on disk is listed, in the order of the saved index, files the index does not know first
+    def __readIndex(self) -> tuple[dict, list]:
+        indexPath = os.path.join(self.directory, "index.json")
+        index = {"links": {}, "files": []}
+        if os.path.exists(indexPath):
+            try:
+                with open(indexPath) as indexFile:
+                    index = json.load(indexFile)
+            except (OSError, ValueError) as e:
+                loggingInstance.error(f"ImageCache index unreadable, rebuilding from the files: {e}")
+
+        onDisk = {}
+        for shard in os.listdir(self.directory):
+            shardPath = os.path.join(self.directory, shard)
+            if os.path.isdir(shardPath):
+                for name in os.listdir(shardPath):
+                    if not name.endswith(".tmp"):
+                        onDisk[name] = os.path.getsize(os.path.join(shardPath, name))
+
+        known = [name for name, _ in index["files"] if name in onDisk]
+        knownSet = set(known)
+        files = [(name, size) for name, size in onDisk.items() if name not in knownSet]
+        files += [(name, onDisk[name]) for name in known]
+        return index["links"], files
+
+    async def __load(self):
+        if self.loaded:
+            return
+        async with self.loadLock:
+            if self.loaded:
+                return
+            await to_thread(os.makedirs, self.directory, exist_ok=True)
+            links, files = await to_thread(self.__readIndex)
+            self.links = links
+            for name, size in files:
+                self.files[name] = size
+                self.totalBytes += size
+            self.loaded = True
+            loggingInstance.info(f"ImageCache loaded {len(self.files)} files, {self.totalBytes / 1048576:.1f} MB") if self.verbose else None
+
+    def __writeIndex(self, index: dict):
+        indexPath = os.path.join(self.directory, "index.json")
+        with open(f"{indexPath}.tmp", "w") as indexFile:
+            json.dump(index, indexFile)
+        os.replace(f"{indexPath}.tmp", indexPath)
+
+    def __snapshot(self) -> dict:
+        # Links whose content is gone from disk would only cost a full download anyway, so they are dropped
+        hashes = {name.split(".")[0] for name in self.files}
+        return {
+            "links": {url: dict(link) for url, link in self.links.items() if link["hash"] in hashes},
+            "files": [[name, size] for name, size in self.files.items()],
+        }
+
+    async def __saveSoon(self):
+        await sleep(5)
+        await to_thread(self.__writeIndex, self.__snapshot())
+
+    def __markDirty(self):
+        if self.saveTask is None or self.saveTask.done():
+            self.saveTask = create_task(self.__saveSoon())
+
+    def __writeFile(self, name: str, body: bytes):
+        path = self.__path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", "wb") as cacheFile:
+            cacheFile.write(body)
+        os.replace(f"{path}.tmp", path)
+
+    def __removeFiles(self, names: list[str]):
+        for name in names:
+            try:
+                os.remove(self.__path(name))
+            except FileNotFoundError:
+                pass
+
+    def __addFile(self, name: str, size: int):
+        self.totalBytes += size - self.files.get(name, 0)
+        self.files[name] = size
+        self.files.move_to_end(name)
+
+    async def __evict(self):
+        evicted = []
+        while self.totalBytes > self.maxBytes and len(self.files) > 1:
+            name, size = self.files.popitem(last=False)
+            self.totalBytes -= size
+            if name != name.split(".")[0]:
+                self.thumbnails.pop(name.split(".")[0], None)
+            evicted.append(name)
+
+        if evicted:
+            self.evictions += len(evicted)
+            await to_thread(self.__removeFiles, evicted)
+            loggingInstance.info(f"ImageCache evicted {len(evicted)} files") if self.verbose else None
+
+    def __remember(self, contentHash: str, image: Image.Image):
+        self.thumbnails[contentHash] = image
+        self.thumbnails.move_to_end(contentHash)
+        while len(self.thumbnails) > self.memoryEntries:
+            self.thumbnails.popitem(last=False)
+
+    def __makeThumbnail(self, body: bytes) -> tuple[Image.Image, bytes]:
+        image = Image.open(BytesIO(body)).convert("RGBA")
+        image.thumbnail((self.thumbnailSize, self.thumbnailSize), Image.Resampling.LANCZOS)
+        encoded = BytesIO()
+        image.save(encoded, "PNG")
+        return image, encoded.getvalue()
+
+    # An original whose bytes no longer match its name is treated as missing
+    def __readOriginal(self, contentHash: str) -> bytes | None:
+        try:
+            with open(self.__path(contentHash), "rb") as cacheFile:
+                body = cacheFile.read()
+        except FileNotFoundError:
+            return None
+        return body if sha256(body).hexdigest() == contentHash else None
+
+    def __readThumbnail(self, name: str) -> Image.Image | None:
+        try:
+            image = Image.open(self.__path(name))
+            image.load()
+            return image
+        except (OSError, ValueError):
+            return None
+
+    async def __storeThumbnail(self, contentHash: str, body: bytes) -> Image.Image:
+        image, encoded = await to_thread(self.__makeThumbnail, body)
+        name = self.__thumbnailName(contentHash)
+        await to_thread(self.__writeFile, name, encoded)
+        self.__addFile(name, len(encoded))
+        return image
+
+    async def __store(self, url: str, result: FetchResult) -> Image.Image:
+        contentHash = sha256(result.body).hexdigest()
+        # Decoding first keeps a link that is not an image out of the cache
+        image = await self.__storeThumbnail(contentHash, result.body)
+        if contentHash not in self.files:
+            await to_thread(self.__writeFile, contentHash, result.body)
+            self.__addFile(contentHash, len(result.body))
+
+        self.links[url] = {"hash": contentHash, "etag": result.etag, "lastModified": result.lastModified, "checked": time()}
+        self.__remember(contentHash, image)
+        await self.__evict()
+        self.__markDirty()
+        return image
+
+    async def __revalidate(self, url: str, link: dict):
+        try:
+            result = await self.fetcher.fetchResult(url, link["etag"], link["lastModified"])
+            if result.body is None or sha256(result.body).hexdigest() == link["hash"]:
+                self.revalidated += 1
+                link["checked"] = time()
+                self.__markDirty()
+            else:
+                self.changed += 1
+                await self.__store(url, result)
+                loggingInstance.info(f"ImageCache {url} changed, new thumbnail stored") if self.verbose else None
+        except Exception as e:
+            # The cached copy keeps being served; the next lookup tries again
+            loggingInstance.error(f"ImageCache revalidation failed for {url}: {e}")
+
+    def __maybeRevalidate(self, url: str, link: dict):
+        if time() - link["checked"] > self.revalidateAfter and url not in self.revalidating:
+            task = self.revalidating[url] = create_task(self.__revalidate(url, link))
+            task.add_done_callback(lambda _: self.revalidating.pop(url, None))
+
+    async def __resolve(self, url: str) -> Image.Image:
+        link = self.links.get(url)
+        if link is not None:
+            contentHash = link["hash"]
+            thumbnailName = self.__thumbnailName(contentHash)
+            image = await to_thread(self.__readThumbnail, thumbnailName) if thumbnailName in self.files else None
+            if image is not None:
+                self.files.move_to_end(thumbnailName)
+            elif contentHash in self.files:
+                body = await to_thread(self.__readOriginal, contentHash)
+                if body is not None:
+                    image = await self.__storeThumbnail(contentHash, body)
+                    await self.__evict()
+
+            if image is not None:
+                self.diskHits += 1
+                self.__remember(contentHash, image)
+                self.__maybeRevalidate(url, link)
+                return image
+
+        self.misses += 1
+        return await self.__store(url, await self.fetcher.fetchResult(url))
+
+    # Never raises: a link that cannot be loaded gives the fetcher's placeholder, which is not cached
+    async def getThumbnail(self, url: str) -> Image.Image:
+        await self.__load()
+
+        link = self.links.get(url)
+        if link is not None and link["hash"] in self.thumbnails:
+            self.memoryHits += 1
+            self.thumbnails.move_to_end(link["hash"])
+            thumbnailName = self.__thumbnailName(link["hash"])
+            self.files.move_to_end(thumbnailName) if thumbnailName in self.files else None
+            self.__maybeRevalidate(url, link)
+            return self.thumbnails[link["hash"]]
+
+        # Players sharing an artwork (every NPC, for one) wait on the same download
+        task = self.inFlight.get(url)
+        if task is None:
+            task = self.inFlight[url] = create_task(self.__resolve(url))
+            task.add_done_callback(lambda _: self.inFlight.pop(url, None))
+        else:
+            self.coalesced += 1
+
+        try:
+            return await shield(task)
+        except CancelledError:
+            raise
+        except Exception as e:
+            self.failures += 1
+            loggingInstance.error(f"ImageCache could not load {url}, using placeholder: {e}")
+            return self.fetcher.placeholder()
+
+    async def close(self):
+        for task in [*self.inFlight.values(), *self.revalidating.values()]:
+            task.cancel()
+        if self.saveTask is not None:
+            self.saveTask.cancel()
+            self.saveTask = None
+        if self.loaded:
+            await to_thread(self.__writeIndex, self.__snapshot())
+
+    def stats(self) -> dict:
+        hits = self.memoryHits + self.diskHits + self.coalesced
+        lookups = hits + self.misses
+        return {
+            "memoryHits": self.memoryHits,
+            "diskHits": self.diskHits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "failures": self.failures,
+            "hitRate": hits / lookups if lookups else 0.0,
+            "revalidated": self.revalidated,
+            "changed": self.changed,
+            "evictions": self.evictions,
+            "files": len(self.files),
+            "bytes": self.totalBytes,
+        }
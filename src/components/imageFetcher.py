@@ -0,0 +1,143 @@
+from components.config import botConfig
+from components.logging import loggingInstance
+
+from asyncio import Semaphore, TimeoutError, sleep, to_thread
+from io import BytesIO
+from random import random
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, TCPConnector
+from PIL import Image
+
+# Statuses worth another attempt; any other error status means the link itself is bad
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+class FetchResult(NamedTuple):
+    body: bytes | None
+    etag: str | None
+    lastModified: str | None
+
+
+class ImageFetcher:
+    # One aiohttp session shared by every battle: total and per-host connection caps, a timeout per attempt,
+    # a byte cap per image and exponential backoff on transient failures. fetch() never raises, a link that
+    # cannot be loaded gives the placeholder tile so one broken NFT does not stop the battle
+    def __init__(self, maxConnections: int | None = None, perHost: int | None = None, timeout: float | None = None,
+                 maxBytes: int | None = None, retries: int | None = None):
+        self.maxConnections = maxConnections if maxConnections is not None else botConfig.getint('image_fetch_connections', fallback=32)
+        self.perHost = perHost if perHost is not None else botConfig.getint('image_fetch_per_host', fallback=4)
+        self.timeout = timeout if timeout is not None else botConfig.getfloat('image_fetch_timeout', fallback=10)
+        self.maxBytes = maxBytes if maxBytes is not None else botConfig.getint('image_max_bytes', fallback=8 * 1024 * 1024)
+        self.retries = retries if retries is not None else botConfig.getint('image_fetch_retries', fallback=3)
+        self.placeholderSize = botConfig.getint('image_placeholder_size', fallback=256)
+        self.session: ClientSession | None = None
+        self.hostLimits: dict[str, Semaphore] = {}
+        self.fetched = 0
+        self.failed = 0
+        self.retried = 0
+        self.bytesFetched = 0
+        self.verbose = botConfig.getboolean('verbose')
+
+    # The session binds to the running loop, so it is only created on first use
+    def __getSession(self) -> ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = ClientSession(
+                connector=TCPConnector(limit=self.maxConnections, limit_per_host=self.perHost, ttl_dns_cache=300),
+                timeout=ClientTimeout(total=self.timeout),
+            )
+        return self.session
+
+    def __hostLimit(self, url: str) -> Semaphore:
+        host = urlsplit(url).hostname or ""
+        limit = self.hostLimits.get(host)
+        if limit is None:
+            limit = self.hostLimits[host] = Semaphore(self.perHost)
+        return limit
+
+    def placeholder(self) -> Image.Image:
+        return Image.new("RGBA", (self.placeholderSize, self.placeholderSize), (40, 40, 40, 255))
+
+    # Waiting for the host's semaphore happens before the request starts, so queued fetches do not use up
+    # their timeout while they wait for a connection
+    async def __download(self, url: str, headers: dict) -> FetchResult:
+        async with self.__hostLimit(url):
+            async with self.__getSession().get(url, headers=headers) as response:
+                if response.status in RETRY_STATUSES:
+                    response.raise_for_status()
+                if response.status == 304:
+                    return FetchResult(None, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                if response.status != 200:
+                    raise ImageFetchError(f"HTTP {response.status}")
+                if response.content_length is not None and response.content_length > self.maxBytes:
+                    raise ImageFetchError(f"ImageTooLarge {response.content_length} bytes")
+
+                # Content-Length can be missing or wrong, so the cap is enforced while reading too
+                body = bytearray()
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    body += chunk
+                    if len(body) > self.maxBytes:
+                        raise ImageFetchError(f"ImageTooLarge over {self.maxBytes} bytes")
+                return FetchResult(bytes(body), response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+    # With an etag or lastModified the request is conditional and an unchanged image comes back with body None
+    async def fetchResult(self, url: str, etag: str | None = None, lastModified: str | None = None) -> FetchResult:
+        if not url or urlsplit(url).scheme not in ("http", "https"):
+            raise ImageFetchError(f"UnsupportedLink {url!r}")
+
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if lastModified:
+            headers["If-Modified-Since"] = lastModified
+
+        for attempt in range(self.retries + 1):
+            try:
+                result = await self.__download(url, headers)
+                self.fetched += 1
+                self.bytesFetched += len(result.body or b"")
+                return result
+            except (ClientError, TimeoutError) as e:
+                if attempt == self.retries:
+                    raise ImageFetchError(f"{type(e).__name__} {e}") from e
+                self.retried += 1
+                delay = 0.5 * 2 ** attempt * (1 + random())
+                loggingInstance.info(f"Retrying {url} in {delay:.1f}s: {type(e).__name__} {e}") if self.verbose else None
+                await sleep(delay)
+
+    async def fetchBytes(self, url: str) -> bytes:
+        return (await self.fetchResult(url)).body
+
+    @staticmethod
+    def decode(body: bytes) -> Image.Image:
+        image = Image.open(BytesIO(body))
+        image.load()
+        return image
+
+    async def fetch(self, url: str) -> Image.Image:
+        try:
+            body = await self.fetchBytes(url)
+            # Decoding a large PNG takes long enough to stall the loop, so it runs in a thread
+            return await to_thread(self.decode, body)
+        except Exception as e:
+            self.failed += 1
+            loggingInstance.error(f"Image fetch failed for {url}, using placeholder: {e}")
+            return self.placeholder()
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    def stats(self) -> dict:
+        return {
+            "fetched": self.fetched,
+            "failed": self.failed,
+            "retried": self.retried,
+            "bytesFetched": self.bytesFetched,
+        }
@@ -1,32 +1,120 @@
+from array import array
+from heapq import nlargest
+
+
+class PlayerStore:
+    # Struct-of-arrays backend: one typed array per stat, indexed by the player's slot
+    def __init__(self):
+        self.alive = array('b')
+        self.kills = array('I')
+        self.deaths = array('I')
+        self.reviveNum = array('I')
+        self.boosts = array('I')
+        self.xrainPower = array('q')
+        self.battleWins = array('I')
+
+    def __len__(self):
+        return len(self.alive)
+
+    def append(self, battleWins, boosts, xrainPower, alive=True, kills=0, deaths=0, reviveNum=0) -> int:
+        self.alive.append(1 if alive else 0)
+        self.kills.append(kills)
+        self.deaths.append(deaths)
+        self.reviveNum.append(reviveNum)
+        self.boosts.append(int(boosts))
+        self.xrainPower.append(int(xrainPower))
+        self.battleWins.append(int(battleWins))
+        return len(self.alive) - 1
+
+    # Move a player's stats into this store and point the view at its new slot
+    def adopt(self, player: 'Players') -> int:
+        if player.store is not self:
+            player.index = self.append(player.battleWins, player.boosts, player.xrainPower,
+                                       player.alive, player.kills, player.deaths, player.reviveNum)
+            player.store = self
+        return player.index
+
+    # A paid boost doubles the player's power; an unpaid one is dropped so it cannot revive the player either
+    def setBoosted(self, index: int, boosted: bool):
+        if boosted:
+            self.xrainPower[index] *= 2
+        else:
+            self.boosts[index] = 0
+
+    def kill(self, index: int):
+        self.alive[index] = 0
+        self.deaths[index] += 1
+
+    def revive(self, index: int):
+        self.alive[index] = 1
+        self.reviveNum[index] += 1
+
+    def addKill(self, index: int):
+        self.kills[index] += 1
+
+    # Same order as sorted(..., reverse=True)[:count], ties keep join order
+    def topIndices(self, stat: array, count: int) -> list[int]:
+        return nlargest(count, range(len(stat)), key=stat.__getitem__)
+
+
 class Players:
-    def __init__(self, xrpId, wager, name, discordId, battleWins, tokenId, boosts:int = 0, xrainPower:int = 0, nftLink = "", taxonId = 0, npc = False, mention = ""):
+    __slots__ = ('store', 'index', 'xrpId', 'wager', 'name', 'discordId', 'NFT',
+                 'nftLink', 'taxonId', 'npc', 'mention', 'nftImage')
+
+    def __init__(self, xrpId, wager, name, discordId, battleWins, tokenId, boosts:int = 0, xrainPower:int = 0, nftLink = "", taxonId = 0, npc = False, mention = "", *, store: PlayerStore):
         self.xrpId = xrpId
         self.wager = wager
         self.name = name
         self.discordId = discordId
-        self.alive = True
-        self.reviveNum = 0
-        self.battleWins = battleWins
         self.NFT = tokenId
-        self.boosts = boosts
-        self.xrainPower = xrainPower
-        self.kills = 0
         self.nftLink = nftLink
-        self.deaths = 0
         self.taxonId = taxonId
         self.npc =  npc
         self.mention = mention
-        
+        self.nftImage = None
+        # Always an explicit store, so a caller cannot end up with seven arrays per player by accident
+        self.store = store
+        self.index = self.store.append(battleWins, boosts, xrainPower)
+
+    @property
+    def alive(self) -> bool:
+        return bool(self.store.alive[self.index])
+
+    @property
+    def kills(self) -> int:
+        return self.store.kills[self.index]
+
+    @property
+    def deaths(self) -> int:
+        return self.store.deaths[self.index]
+
+    @property
+    def reviveNum(self) -> int:
+        return self.store.reviveNum[self.index]
+
+    @property
+    def boosts(self) -> int:
+        return self.store.boosts[self.index]
+
+    @property
+    def xrainPower(self) -> int:
+        return self.store.xrainPower[self.index]
+
+    @property
+    def battleWins(self) -> int:
+        return self.store.battleWins[self.index]
+
+    def setBoosted(self, boosted: bool):
+        self.store.setBoosted(self.index, boosted)
+
     def kill(self):
-        self.alive = False
-        self.deaths += 1
-        
+        self.store.kill(self.index)
+
     def revive(self):
-        self.alive = True
-        self.reviveNum += 1
-        
+        self.store.revive(self.index)
+
     def addKill(self):
-        self.kills += 1
-        
+        self.store.addKill(self.index)
+
     def addNFTImage(self, nftImage):
-        self.nftImage = nftImage
\ No newline at end of file
+        self.nftImage = nftImage
@@ -0,0 +1,92 @@
+from components.config import gameConfig
+from components.logging import loggingInstance
+from database.db import BattleRoyaleDB
+
+from abc import ABC, abstractmethod
+from asyncio import sleep, create_task, CancelledError, Task
+from random import Random
+
+import random
+
+
+class RefreshingPool(ABC):
+    # Rows kept in memory and reloaded from the DB in the background every refreshInterval seconds
+    def __init__(self, refreshInterval: int):
+        self.refreshInterval = refreshInterval
+        self.refreshTask: Task | None = None
+        self.verbose = gameConfig.getboolean('verbose')
+
+    @abstractmethod
+    async def refresh(self):
+        pass
+
+    async def __refreshLoop(self):
+        while True:
+            await sleep(self.refreshInterval)
+            try:
+                await self.refresh()
+            except CancelledError:
+                raise
+            except Exception as e:
+                # Keep serving the previous snapshot if the DB is unavailable
+                loggingInstance.error(f"{type(self).__name__} refresh failed: {e}")
+
+    def startRefresh(self):
+        if self.refreshTask is None or self.refreshTask.done():
+            self.refreshTask = create_task(self.__refreshLoop())
+
+    def stopRefresh(self):
+        if self.refreshTask is not None:
+            self.refreshTask.cancel()
+            self.refreshTask = None
+
+
+class ClaimQuotePool(RefreshingPool):
+    # Claim quotes grouped by taxon; a taxon without its own quotes uses the taxon 0 ones
+    def __init__(self, dbInstance: BattleRoyaleDB, refreshInterval: int | None = None):
+        super().__init__(refreshInterval if refreshInterval is not None else gameConfig.getint('claim_quote_refresh_interval', fallback=900))
+        self.dbInstance = dbInstance
+        self.quotesByTaxon: dict[int, list[tuple[str, str]]] = {}
+
+    def load(self, rows):
+        quotesByTaxon = {}
+        for taxonId, nftGroupName, description in rows:
+            quotesByTaxon.setdefault(taxonId, []).append((nftGroupName, description))
+
+        self.quotesByTaxon = quotesByTaxon
+        loggingInstance.info(f"ClaimQuotePool loaded {len(rows)} quotes for {len(quotesByTaxon)} taxons") if self.verbose else None
+
+    async def refresh(self):
+        self.load(await self.dbInstance.getAllClaimQuotes())
+
+    def draw(self, taxonId, rng: Random = random) -> dict:
+        quotes = self.quotesByTaxon.get(taxonId) or self.quotesByTaxon.get(0)
+
+        if not quotes:
+            loggingInstance.error(f"ClaimQuotePool.draw({taxonId}): ClaimQuoteError")
+            raise Exception("ClaimQuoteError")
+
+        nftGroupName, description = quotes[int(rng.random() * len(quotes))]
+        return {"nftGroupName": nftGroupName, "description": description}
+
+
+class NPCPool(RefreshingPool):
+    # The npcPlayer profiles, for filling lobbies without a random-order scan of the rewards table
+    def __init__(self, dbInstance: BattleRoyaleDB, refreshInterval: int | None = None):
+        super().__init__(refreshInterval if refreshInterval is not None else gameConfig.getint('npc_refresh_interval', fallback=900))
+        self.dbInstance = dbInstance
+        self.profiles: list[dict] = []
+
+    def load(self, profiles: list[dict]):
+        self.profiles = list(profiles)
+        loggingInstance.info(f"NPCPool loaded {len(self.profiles)} NPCs") if self.verbose else None
+
+    async def refresh(self):
+        self.load(await self.dbInstance.getNPCProfiles())
+
+    # Distinct NPCs, as many as the pool has up to count
+    def draw(self, count: int = 1, rng: Random = random) -> list[dict]:
+        if not self.profiles:
+            raise Exception("xrpIdNotFound")
+
+        return rng.sample(self.profiles, min(count, len(self.profiles)))
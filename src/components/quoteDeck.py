@@ -0,0 +1,132 @@
+from components.config import gameConfig
+from components.logging import loggingInstance
+from components.quoteTemplates import QuoteTemplate
+from components.pools import RefreshingPool
+from database.db import BattleRoyaleDB
+
+from random import Random
+from typing import NamedTuple
+
+import random
+
+
+class BattleQuote(NamedTuple):
+    quoteId: int
+    quoteType: str
+    quoteDesc: str
+    template: QuoteTemplate | None = None
+
+
+class AliasTable:
+    # Vose's alias method: O(n) to build, O(1) per weighted draw
+    def __init__(self, weights: list[float]):
+        entries = len(weights)
+        totalWeight = float(sum(weights))
+        if entries == 0 or totalWeight <= 0:
+            raise Exception("EmptyAliasTable")
+
+        scaled = [weight * entries / totalWeight for weight in weights]
+        self.probability = [1.0] * entries
+        self.alias = list(range(entries))
+
+        small = [index for index, weight in enumerate(scaled) if weight < 1.0]
+        large = [index for index, weight in enumerate(scaled) if weight >= 1.0]
+
+        while small and large:
+            smallIndex = small.pop()
+            largeIndex = large.pop()
+            self.probability[smallIndex] = scaled[smallIndex]
+            self.alias[smallIndex] = largeIndex
+            scaled[largeIndex] -= 1.0 - scaled[smallIndex]
+            (small if scaled[largeIndex] < 1.0 else large).append(largeIndex)
+
+        # Whatever is left over is only there because of float rounding
+        for index in small + large:
+            self.probability[index] = 1.0
+
+    def sample(self, rng: Random = random) -> int:
+        roll = rng.random() * len(self.probability)
+        column = int(roll)
+        return column if roll - column < self.probability[column] else self.alias[column]
+
+
+class DeckSnapshot:
+    # Immutable view of the deck, swapped in one assignment on every refresh
+    def __init__(self, quotes: list[BattleQuote], weights: dict[str, float]):
+        self.quotesById = {quote.quoteId: quote for quote in quotes}
+        self.quotesByCategory: dict[str, list[BattleQuote]] = {}
+        for quote in quotes:
+            self.quotesByCategory.setdefault(quote.quoteType, []).append(quote)
+
+        self.categoryNames = {category.lower(): category for category in self.quotesByCategory}
+
+        # Without configured weights a category weighs as much as its number of quotes,
+        # which is the same distribution the old ORDER BY RAND() query produced
+        categoryWeights = {
+            category: weights.get(category.lower(), len(categoryQuotes))
+            for category, categoryQuotes in self.quotesByCategory.items()
+        }
+
+        self.categories = [category for category, weight in categoryWeights.items() if weight > 0]
+        self.fullTable = AliasTable([categoryWeights[category] for category in self.categories]) if self.categories else None
+
+        self.aliveCategories = [category for category in self.categories if category != "Revival"]
+        self.aliveTable = AliasTable([categoryWeights[category] for category in self.aliveCategories]) if self.aliveCategories else None
+
+
+def parseQuoteWeights(rawWeights: str) -> dict[str, float]:
+    # Format: "Neutral: 2, Normal Kill: 3, Revival: 0.5"
+    weights = {}
+    for entry in rawWeights.split(","):
+        if not entry.strip():
+            continue
+        category, _, weight = entry.rpartition(":")
+        weights[category.strip().lower()] = float(weight)
+    return weights
+
+
+class QuoteDeck(RefreshingPool):
+    def __init__(self, dbInstance: BattleRoyaleDB, weights: dict[str, float] | None = None, refreshInterval: int | None = None):
+        super().__init__(refreshInterval if refreshInterval is not None else gameConfig.getint('quote_refresh_interval', fallback=900))
+        self.dbInstance = dbInstance
+        self.weights = weights if weights is not None else parseQuoteWeights(gameConfig.get('quote_weights', fallback=''))
+        self.snapshot = DeckSnapshot([], self.weights)
+
+    # Quotes are parsed into templates here, once per load, instead of on every engagement
+    def load(self, quotes: list[BattleQuote]):
+        self.snapshot = DeckSnapshot(
+            [BattleQuote(quoteId, quoteType, quoteDesc, QuoteTemplate(quoteDesc)) for quoteId, quoteType, quoteDesc, *_ in quotes],
+            self.weights,
+        )
+        loggingInstance.info(f"QuoteDeck loaded {len(quotes)} quotes in {len(self.snapshot.categories)} categories") if self.verbose else None
+
+    async def refresh(self):
+        self.load(await self.dbInstance.getAllQuotes())
+
+    def draw(self, revival: bool = False, rng: Random = random) -> BattleQuote:
+        snapshot = self.snapshot
+        table, categories = (snapshot.fullTable, snapshot.categories) if revival else (snapshot.aliveTable, snapshot.aliveCategories)
+
+        if table is None:
+            raise Exception("RandomQuoteGetError")
+
+        categoryQuotes = snapshot.quotesByCategory[categories[table.sample(rng)]]
+        return categoryQuotes[int(rng.random() * len(categoryQuotes))]
+
+    def getQuote(self, quoteId: int) -> BattleQuote:
+        quote = self.snapshot.quotesById.get(quoteId)
+
+        if quote is None:
+            raise Exception("QuoteNotFound")
+
+        return quote
+
+    def drawCategory(self, category: str, rng: Random = random) -> BattleQuote:
+        snapshot = self.snapshot
+        categoryName = snapshot.categoryNames.get(category.lower())
+
+        if categoryName is None:
+            raise Exception("QuoteCategoryNotFound")
+
+        categoryQuotes = snapshot.quotesByCategory[categoryName]
+        return categoryQuotes[int(rng.random() * len(categoryQuotes))]
@@ -0,0 +1,39 @@
+import re
+
+MARKDOWN_ESCAPES = str.maketrans({char: f"\\{char}" for char in "*_~`"})
+SLOT_PATTERN = re.compile(r"\$Player([12])")
+
+
+def escapeMarkdown(text: str) -> str:
+    return str(text).translate(MARKDOWN_ESCAPES)
+
+
+# How a player name appears inside a quote
+def formatName(name: str) -> str:
+    return f"**{escapeMarkdown(name)}**"
+
+
+class QuoteTemplate:
+    # A quote split once into literal text and $Player1/$Player2 slots
+    __slots__ = ('literals', 'slots')
+
+    def __init__(self, text: str):
+        self.literals: list[str] = []
+        self.slots: list[int] = []
+
+        position = 0
+        for match in SLOT_PATTERN.finditer(text):
+            self.literals.append(text[position:match.start()])
+            self.slots.append(int(match.group(1)))
+            position = match.end()
+        self.literals.append(text[position:])
+
+    # Slot values are already formatted names; a slot without a value keeps its placeholder
+    def render(self, playerOne: str, playerTwo: str | None = None, suffix: str = "") -> str:
+        parts = [self.literals[0]]
+        for slot, literal in zip(self.slots, self.literals[1:]):
+            value = playerOne if slot == 1 else playerTwo
+            parts.append(value if value is not None else f"$Player{slot}")
+            parts.append(literal)
+        parts.append(suffix)
+        return "".join(parts)
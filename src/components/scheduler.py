@@ -0,0 +1,121 @@
+from components.config import botConfig
+from components.logging import loggingInstance
+
+from asyncio import FIRST_COMPLETED, Future, Semaphore, get_running_loop, wait
+from collections import deque
+from typing import Awaitable, Callable
+
+
+class BattleTicket:
+    def __init__(self, guildId: int, future: Future):
+        self.guildId = guildId
+        self.future = future
+        self.position = 0
+        self.running = False
+        self.moved = future.get_loop().create_future()
+
+    def moveTo(self, position: int):
+        if position != self.position:
+            self.position = position
+            self.moved.set_result(position)
+            self.moved = self.future.get_loop().create_future()
+
+    # Returns once the battle may start; onMove is awaited with the new position whenever the queue moves
+    async def wait(self, onMove: Callable[[int], Awaitable] | None = None):
+        reported = self.position
+        while not self.future.done():
+            if onMove is not None and self.position != reported:
+                reported = self.position
+                await onMove(reported)
+                continue
+            await wait((self.future, self.moved), return_when=FIRST_COMPLETED)
+        await self.future
+
+
+class BattleScheduler:
+    # Owns every running battle: caps them globally and per guild, queues the rest in FIFO order
+    # and shares one bounded pool for the image/DB work battles start
+    def __init__(self, maxBattles: int | None = None, maxPerGuild: int | None = None, ioLimit: int | None = None):
+        self.maxBattles = maxBattles if maxBattles is not None else botConfig.getint('max_battles', fallback=5)
+        self.maxPerGuild = maxPerGuild if maxPerGuild is not None else botConfig.getint('max_battles_per_guild', fallback=2)
+        self.ioLimit = ioLimit if ioLimit is not None else botConfig.getint('max_io_tasks', fallback=16)
+        self.ioSemaphore = Semaphore(self.ioLimit)
+        self.ioInUse = 0
+        self.activeByGuild: dict[int, int] = {}
+        self.activeCount = 0
+        self.waiting: deque[BattleTicket] = deque()
+        self.verbose = botConfig.getboolean('verbose')
+
+    @property
+    def queuedCount(self) -> int:
+        return len(self.waiting)
+
+    def __canStart(self, guildId: int) -> bool:
+        return self.activeCount < self.maxBattles and self.activeByGuild.get(guildId, 0) < self.maxPerGuild
+
+    def __start(self, ticket: BattleTicket):
+        ticket.running = True
+        ticket.position = 0
+        self.activeCount += 1
+        self.activeByGuild[ticket.guildId] = self.activeByGuild.get(ticket.guildId, 0) + 1
+        if not ticket.future.done():
+            ticket.future.set_result(None)
+
+    # Start every waiting ticket that fits, oldest first; a guild at its cap does not block other guilds
+    def __dispatch(self):
+        for ticket in list(self.waiting):
+            if self.activeCount >= self.maxBattles:
+                break
+            if self.__canStart(ticket.guildId):
+                self.waiting.remove(ticket)
+                self.__start(ticket)
+
+        for position, ticket in enumerate(self.waiting, start=1):
+            ticket.moveTo(position)
+
+    def enqueue(self, guildId: int | None) -> BattleTicket:
+        ticket = BattleTicket(guildId or 0, get_running_loop().create_future())
+
+        # Anything still waiting is blocked by a cap, so a request that fits can start right away
+        if self.__canStart(ticket.guildId):
+            self.__start(ticket)
+        else:
+            self.waiting.append(ticket)
+            ticket.position = len(self.waiting)
+            loggingInstance.info(f"Battle queued for guild {ticket.guildId} at position {ticket.position}") if self.verbose else None
+
+        return ticket
+
+    # Call once the battle is over or the request was abandoned while queued
+    def release(self, ticket: BattleTicket):
+        if ticket.running:
+            ticket.running = False
+            self.activeCount -= 1
+            self.activeByGuild[ticket.guildId] -= 1
+            if not self.activeByGuild[ticket.guildId]:
+                del self.activeByGuild[ticket.guildId]
+        elif ticket in self.waiting:
+            self.waiting.remove(ticket)
+            ticket.future.cancel()
+
+        self.__dispatch()
+
+    # Takes a function returning the awaitable, so nothing is created before a slot is free and a caller
+    # cancelled while waiting leaves no coroutine behind that was never awaited
+    async def runIO(self, start: Callable[[], Awaitable]):
+        async with self.ioSemaphore:
+            self.ioInUse += 1
+            try:
+                return await start()
+            finally:
+                self.ioInUse -= 1
+
+    def status(self) -> dict:
+        return {
+            "active": self.activeCount,
+            "maxBattles": self.maxBattles,
+            "activeByGuild": dict(self.activeByGuild),
+            "queued": self.queuedCount,
+            "ioInUse": self.ioInUse,
+            "ioLimit": self.ioLimit,
+        }
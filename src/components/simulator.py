@@ -0,0 +1,269 @@
+import numpy as np
+
+from time import perf_counter
+
+# Category order used by the simulator arrays; mirrors the cases in Battle.battle()
+SIM_CATEGORIES = ["High Rank Kill", "High XRAIN Kill", "Low XRAIN Kill", "Normal Kill", "Neutral", "Revival"]
+HIGH_RANK_KILL, HIGH_XRAIN_KILL, LOW_XRAIN_KILL, NORMAL_KILL, NEUTRAL, REVIVAL = range(len(SIM_CATEGORIES))
+
+
+class SimulationRoster:
+    def __init__(self, names: list[str], battleWins, xrainPower, boosts):
+        self.names = list(names)
+        self.battleWins = np.asarray(battleWins, dtype=np.int64)
+        self.xrainPower = np.asarray(xrainPower, dtype=np.int64)
+        self.boosts = np.asarray(boosts, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.names)
+
+    # Same effective power main.py gives a Players instance when it joins a lobby
+    @classmethod
+    def fromProfiles(cls, profiles: list[dict], boostMultiplier: float = 2):
+        return cls(
+            names=[profile['xrpId'] for profile in profiles],
+            battleWins=[int(profile['battleWins']) for profile in profiles],
+            xrainPower=[int(int(profile['xrainPower']) * (boostMultiplier if int(profile['reserveBoosts']) > 0 else 1)) for profile in profiles],
+            boosts=[int(profile['reserveBoosts']) for profile in profiles],
+        )
+
+    @classmethod
+    def synthetic(cls, playerNum: int, seed: int | None = None, boostMultiplier: float = 2, boostedShare: float = 0.3):
+        rng = np.random.default_rng(seed)
+        boosts = (rng.random(playerNum) < boostedShare).astype(np.int64) * rng.integers(1, 20, playerNum)
+        xrainPower = rng.integers(50, 5000, playerNum)
+        return cls(
+            names=[f"player{index}" for index in range(playerNum)],
+            battleWins=rng.integers(0, 120, playerNum),
+            xrainPower=(xrainPower * np.where(boosts > 0, boostMultiplier, 1)).astype(np.int64),
+            boosts=boosts,
+        )
+
+
+class SimulationReport:
+    def __init__(self, roster: SimulationRoster, battles: int, wins, kills, killHistogram, roundsSurvived, rounds, unfinished: int, elapsed: float):
+        self.roster = roster
+        self.battles = battles
+        self.winProbability = wins / battles
+        self.meanKills = kills / battles
+        self.killDistribution = killHistogram / battles
+        self.meanRoundsSurvived = roundsSurvived / battles
+        self.rounds = rounds
+        self.unfinished = unfinished
+        self.elapsed = elapsed
+
+    def asDict(self) -> dict:
+        return {
+            "battles": self.battles,
+            "unfinished": self.unfinished,
+            "elapsed": self.elapsed,
+            "rounds": {
+                "mean": float(self.rounds.mean()),
+                "p50": float(np.percentile(self.rounds, 50)),
+                "p95": float(np.percentile(self.rounds, 95)),
+                "max": int(self.rounds.max()),
+            },
+            "players": [
+                {
+                    "name": name,
+                    "battleWins": int(self.roster.battleWins[index]),
+                    "xrainPower": int(self.roster.xrainPower[index]),
+                    "boosts": int(self.roster.boosts[index]),
+                    "winProbability": float(self.winProbability[index]),
+                    "meanKills": float(self.meanKills[index]),
+                    "meanRoundsSurvived": float(self.meanRoundsSurvived[index]),
+                    "killDistribution": [float(share) for share in self.killDistribution[index]],
+                }
+                for index, name in enumerate(self.roster.names)
+            ],
+        }
+
+    def format(self, top: int = 20) -> str:
+        lines = [
+            f"{self.battles} battles of {len(self.roster)} players in {self.elapsed:.1f}s "
+            f"({self.battles / max(self.elapsed, 1e-9) * 60:,.0f} battles/min)",
+            f"Rounds: mean {self.rounds.mean():.2f} | p50 {np.percentile(self.rounds, 50):.0f} | "
+            f"p95 {np.percentile(self.rounds, 95):.0f} | max {self.rounds.max()} | unfinished {self.unfinished}",
+            "",
+            f"{'Player':<36}{'Wins':>6}{'Power':>8}{'Boost':>6}{'Win %':>8}{'Kills':>7}{'Rounds':>8}  P(0/1/2/3+ kills)",
+        ]
+        order = np.argsort(-self.winProbability, kind="stable")
+        for index in order[:top]:
+            distribution = self.killDistribution[index]
+            killShares = list(distribution[:3]) + [distribution[3:].sum()]
+            lines.append(
+                f"{self.roster.names[index][:35]:<36}{self.roster.battleWins[index]:>6}{self.roster.xrainPower[index]:>8}"
+                f"{self.roster.boosts[index]:>6}{self.winProbability[index] * 100:>7.2f}%{self.meanKills[index]:>7.2f}"
+                f"{self.meanRoundsSurvived[index]:>8.2f}  {' / '.join(f'{share:.2f}' for share in killShares)}"
+            )
+        return "\n".join(lines)
+
+
+class BattleSimulator:
+    # Runs many independent battles side by side: every array is (battles, players)
+    # and each step of a round resolves one engagement in every battle at once.
+    #
+    # Pick order matches BattleRoster: playerOne is uniform over the unvisited players,
+    # which is the same as walking a fresh random permutation and skipping visited ones;
+    # playerTwo is uniform over the alive unvisited players, which is the same as taking
+    # the lowest per-round random key among them because that pool only ever shrinks.
+    def __init__(self, roster: SimulationRoster, categoryWeights: dict[str, float], maxRevive: int, seed: int | None = None, maxRounds: int = 1000):
+        if len(roster) < 2:
+            raise Exception("SimulationNeedsTwoPlayers")
+
+        self.roster = roster
+        self.maxRevive = maxRevive
+        self.maxRounds = maxRounds
+        self.rng = np.random.default_rng(seed)
+
+        weights = np.array([float(categoryWeights.get(category.lower(), 0)) for category in SIM_CATEGORIES])
+        if weights[:REVIVAL].sum() <= 0:
+            raise Exception("RandomQuoteGetError")
+
+        # Dead players draw from every category and only act on Revival,
+        # alive players draw from every category except Revival
+        self.revivalChance = weights[REVIVAL] / weights.sum()
+        self.aliveCumulative = np.cumsum(weights[:REVIVAL] / weights[:REVIVAL].sum())
+        self.aliveCumulative[-1] = 1.0
+
+        self.canRevive = roster.boosts > 0
+
+    def runBatch(self, battles: int):
+        rng = self.rng
+        playerNum = len(self.roster)
+        battleWins = self.roster.battleWins
+        xrainPower = self.roster.xrainPower
+
+        alive = np.ones((battles, playerNum), dtype=bool)
+        kills = np.zeros((battles, playerNum), dtype=np.int32)
+        reviveNum = np.zeros((battles, playerNum), dtype=np.int32)
+        roundsSurvived = np.zeros((battles, playerNum), dtype=np.int32)
+        aliveCount = np.full(battles, playerNum, dtype=np.int64)
+
+        # Results per battle, filled as battles finish
+        outIndex = np.arange(battles)
+        outWinner = np.full(battles, -1, dtype=np.int64)
+        outRounds = np.zeros(battles, dtype=np.int64)
+        outKills = np.zeros((battles, playerNum), dtype=np.int32)
+        outRoundsSurvived = np.zeros((battles, playerNum), dtype=np.int32)
+
+        roundNumber = 0
+        while len(outIndex) and roundNumber < self.maxRounds:
+            roundNumber += 1
+            running = len(outIndex)
+            rows = np.arange(running)
+
+            visited = np.zeros((running, playerNum), dtype=bool)
+            available = alive.copy()
+            availableCount = aliveCount.copy()
+            pickOrder = np.argsort(rng.random((running, playerNum)), axis=1)
+            opponentKeys = rng.random((running, playerNum))
+            rolls = rng.random((running, playerNum))
+            coinFlips = rng.random((running, playerNum)) < 0.5
+
+            for step in range(playerNum):
+                playerOne = pickOrder[:, step]
+                active = ~visited[rows, playerOne]
+                visited[rows, playerOne] = True
+                playerOneAlive = alive[rows, playerOne]
+                roll = rolls[:, step]
+
+                # Dead player: Revival roll, gated on boosts and max_revive
+                revive = np.flatnonzero(
+                    active & ~playerOneAlive & (roll < self.revivalChance)
+                    & self.canRevive[playerOne] & (reviveNum[rows, playerOne] < self.maxRevive)
+                )
+                if len(revive):
+                    alive[revive, playerOne[revive]] = True
+                    reviveNum[revive, playerOne[revive]] += 1
+                    aliveCount[revive] += 1
+
+                # Alive player: leaves the opponent pool, then rolls a category
+                fighting = active & playerOneAlive
+                available[rows[fighting], playerOne[fighting]] = False
+                availableCount[fighting] -= 1
+                category = np.searchsorted(self.aliveCumulative, roll, side="right")
+                engage = np.flatnonzero(fighting & (availableCount > 0) & (category < NEUTRAL))
+                if not len(engage):
+                    continue
+
+                one = playerOne[engage]
+                two = np.where(available[engage], opponentKeys[engage], 2.0).argmin(axis=1)
+                visited[engage, two] = True
+                available[engage, two] = False
+                availableCount[engage] -= 1
+
+                engageCategory = category[engage]
+                oneLoses = np.select(
+                    [engageCategory == HIGH_RANK_KILL, engageCategory == HIGH_XRAIN_KILL, engageCategory == LOW_XRAIN_KILL],
+                    [battleWins[one] < battleWins[two], xrainPower[one] < xrainPower[two], ~(xrainPower[one] < xrainPower[two])],
+                    coinFlips[engage, step],
+                )
+                loser = np.where(oneLoses, one, two)
+                winner = np.where(oneLoses, two, one)
+                alive[engage, loser] = False
+                kills[engage, winner] += 1
+                aliveCount[engage] -= 1
+
+            roundsSurvived += alive
+
+            finished = aliveCount == 1
+            if finished.any():
+                done = outIndex[finished]
+                outWinner[done] = alive[finished].argmax(axis=1)
+                outRounds[done] = roundNumber
+                outKills[done] = kills[finished]
+                outRoundsSurvived[done] = roundsSurvived[finished]
+
+                keep = ~finished
+                outIndex = outIndex[keep]
+                alive, kills, reviveNum = alive[keep], kills[keep], reviveNum[keep]
+                roundsSurvived, aliveCount = roundsSurvived[keep], aliveCount[keep]
+
+        # Battles that hit maxRounds keep their partial stats and have no winner
+        outRounds[outIndex] = roundNumber
+        outKills[outIndex] = kills
+        outRoundsSurvived[outIndex] = roundsSurvived
+
+        return outWinner, outRounds, outKills, outRoundsSurvived
+
+    def run(self, battles: int, batchSize: int = 4096) -> SimulationReport:
+        playerNum = len(self.roster)
+        wins = np.zeros(playerNum, dtype=np.int64)
+        kills = np.zeros(playerNum, dtype=np.int64)
+        roundsSurvived = np.zeros(playerNum, dtype=np.int64)
+        killHistogram = np.zeros((playerNum, playerNum), dtype=np.int64)
+        rounds = []
+        unfinished = 0
+
+        start = perf_counter()
+        remaining = battles
+        while remaining > 0:
+            batch = min(batchSize, remaining)
+            remaining -= batch
+
+            winners, batchRounds, batchKills, batchRoundsSurvived = self.runBatch(batch)
+            finished = winners >= 0
+            unfinished += int((~finished).sum())
+            wins += np.bincount(winners[finished], minlength=playerNum)
+            kills += batchKills.sum(axis=0)
+            roundsSurvived += batchRoundsSurvived.sum(axis=0)
+
+            # Kills per battle are capped at playerNum-1 only without revivals, so clip into the last bucket
+            clipped = np.minimum(batchKills, playerNum - 1)
+            killHistogram += np.bincount(
+                (np.arange(playerNum) * playerNum + clipped).ravel(), minlength=playerNum * playerNum
+            ).reshape(playerNum, playerNum)
+            rounds.append(batchRounds)
+
+        return SimulationReport(
+            roster=self.roster,
+            battles=battles,
+            wins=wins,
+            kills=kills,
+            killHistogram=killHistogram,
+            roundsSurvived=roundsSurvived,
+            rounds=np.concatenate(rounds),
+            unfinished=unfinished,
+            elapsed=perf_counter() - start,
+        )
@@ -1,68 +1,307 @@
 from database.models import BattleQuotes, NFTTraitList, RewardsTable, ClaimQuotes
+from database.instrumentation import QueryStats, TimedQueuePool, instrumented
 from components.config import dbConfig
 from components.logging import loggingInstance
 
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-from sqlalchemy import update, or_, and_
+from sqlalchemy.pool import StaticPool
+from sqlalchemy import update, or_, and_, case
 from sqlalchemy.sql import func
 from datetime import timedelta, datetime
 from sqlalchemy.future import select
+from asyncio import Task, ensure_future, shield
+from collections import OrderedDict
+from time import monotonic
+from typing import Awaitable, Callable, Iterable
 
 
-class BattleRoyaleDB:
-    def __init__(self, host, dbName, username, password, verbose):
+def battleRank(battleWins) -> str:
+    if battleWins >= 100:
+        return "Diamond Xrain King :gem::crown:"
+    elif battleWins < 10:
+        return "Rookie :punch:"
+    elif battleWins < 25:
+        return "Bronze Warrior :third_place:"
+    elif battleWins < 50:
+        return "Silver Xrain Lord :coin:"
+    return "Golden Oracle Warlord :trident:"
+
+
+class ProfileCache:
+    # In-process TTL + LRU cache for profile reads. Every entry is tagged with the xrpIds and discordIds it
+    # was built from, so a write to either identifier drops it, and concurrent misses on a key share one query
+    def __init__(self, maxEntries: int = 4096, ttl: float = 60):
+        self.maxEntries = maxEntries
+        self.ttl = ttl
+        self.entries: OrderedDict[tuple, tuple[float, object, frozenset]] = OrderedDict()
+        self.keysByTag: dict[str, set[tuple]] = {}
+        self.pending: dict[tuple, Task] = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    def __drop(self, key: tuple):
+        _, _, tags = self.entries.pop(key)
+        for tag in tags:
+            keys = self.keysByTag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.keysByTag[tag]
+
+    def __store(self, key: tuple, value, tags: Iterable):
+        if key in self.entries:
+            self.__drop(key)
+
+        tags = frozenset(str(tag) for tag in tags if tag)
+        self.entries[key] = (monotonic() + self.ttl, value, tags)
+        for tag in tags:
+            self.keysByTag.setdefault(tag, set()).add(key)
+
+        while len(self.entries) > self.maxEntries:
+            self.__drop(next(iter(self.entries)))
+
+    async def __load(self, key: tuple, generation: int, load: Callable[[], Awaitable[tuple[object, Iterable]]]):
+        try:
+            value, tags = await load()
+        finally:
+            self.pending.pop((key, generation), None)
+
+        # A write that committed while the query ran may have made this result stale
+        if generation == self.generation:
+            self.__store(key, value, tags)
+        return value
+
+    # load returns (value, tags); cached values are shared between callers and must be treated as read-only
+    async def get(self, key: tuple, load: Callable[[], Awaitable[tuple[object, Iterable]]]):
+        if self.ttl <= 0 or self.maxEntries <= 0:
+            self.misses += 1
+            value, _ = await load()
+            return value
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.__drop(key)
+
+        # Queries are only shared within one generation: a caller arriving after a write must not get the
+        # result of a query that started before it committed
+        pendingKey = (key, self.generation)
+        task = self.pending.get(pendingKey)
+        if task is None:
+            self.misses += 1
+            task = ensure_future(self.__load(key, self.generation, load))
+            self.pending[pendingKey] = task
+        else:
+            self.coalesced += 1
+
+        # A cancelled caller must not cancel the query other callers are waiting on
+        return await shield(task)
+
+    # Call after the write has committed
+    def invalidate(self, *identifiers):
+        self.generation += 1
+        for tag in {str(identifier) for identifier in identifiers if identifier}:
+            for key in list(self.keysByTag.get(tag, ())):
+                if key in self.entries:
+                    self.__drop(key)
+                    self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+            "hitRate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+
+# Engine URL and options for the DATABASE db_backend setting
+def engineSettings(backend, host, dbName, username, password, sqlitePath=None) -> tuple[str, dict]:
+    match backend:
+        case "mysql":
+            #                   username          if empty, do not add :, else :password      host   dbName
+            sqlLink = f"mysql+aiomysql://{username}{'' if password in ['', None] else f':{password}'}@{host}/{dbName}"
+            return sqlLink, {"poolclass": TimedQueuePool, "pool_recycle": 1800, "pool_pre_ping": True, "pool_use_lifo": True}
+        case "sqlite":
+            sqlitePath = sqlitePath or dbConfig.get("sqlite_path", fallback="xrain.sqlite3")
+            # An in-memory database only exists on its one connection
+            if sqlitePath == ":memory:":
+                return "sqlite+aiosqlite://", {"poolclass": StaticPool}
+            return f"sqlite+aiosqlite:///{sqlitePath}", {"poolclass": TimedQueuePool, "connect_args": {"timeout": 30}}
 
-        #                   username          if empty, do not add :, else :password      host   dbName
-        sqlLink = f"mysql+aiomysql://{username}{'' if password in ['', None] else f':{password}'}@{host}/{dbName}"
+    raise Exception("UnknownDBBackend")
+
+
+class BattleRoyaleDB:
+    def __init__(self, host, dbName, username, password, verbose, backend=None, sqlitePath=None):
+        self.backend = backend or dbConfig.get("db_backend", fallback="mysql")
+        sqlLink, engineOptions = engineSettings(self.backend, host, dbName, username, password, sqlitePath)
         loggingInstance.info(f"DB Link: {sqlLink}")
-        self.dbEngine = create_async_engine(
-            sqlLink, pool_recycle=1800, pool_pre_ping=True, pool_use_lifo=True
-        )
+        self.dbEngine = create_async_engine(sqlLink, **engineOptions)
+        self.queryStats = QueryStats()
+        self.queryStats.attach(self.dbEngine)
 
         self.asyncSessionMaker = async_sessionmaker(
             bind=self.dbEngine, expire_on_commit=False
         )
         self.verbose = verbose
+        self.profileCache = ProfileCache(
+            dbConfig.getint("profile_cache_size", fallback=4096),
+            dbConfig.getfloat("profile_cache_ttl", fallback=60),
+        )
+
+    # Connection settings from the DATABASE section; the server ones are optional for SQLite
+    @classmethod
+    def fromConfig(cls, **kwargs):
+        return cls(
+            host=dbConfig.get("db_server", fallback=""),
+            dbName=dbConfig.get("db_name", fallback=""),
+            username=dbConfig.get("db_username", fallback=""),
+            password=dbConfig.get("db_password", fallback=""),
+            verbose=dbConfig.getboolean("verbose", fallback=False),
+            **kwargs,
+        )
 
     # A temporary function that helps with the migration of battle wins from rewards to nfttraitlist
+    @instrumented
     async def syncBattleWins(self):
-        async with self.asyncSessionMaker() as session:
-            async with session.begin():
-                query = select(
-                    RewardsTable.tokenIdBattleNFT, RewardsTable.battleWins
-                ).filter(RewardsTable.tokenIdBattleNFT != "")
-                query = await session.execute(query)
-                entries = query.all()
+        async for chunk in self.syncBattleWinsChunks():
+            (
+                loggingInstance.info(
+                    f"syncBattleWins(): {chunk['rows']} rows up to {chunk['lastXrpId']}, {chunk['changed']} updated"
+                )
+                if self.verbose
+                else None
+            )
+        print("Done")
 
-                for tokenId, battleWins in entries:
-                    await session.execute(
-                        update(NFTTraitList)
-                        .where(NFTTraitList.tokenId == tokenId)
-                        .values(battleWins=battleWins)
+    # Walks RewardsTable by xrpId in chunks and copies battleWins onto the matching NFTTraitList rows.
+    # Each chunk is one bulk UPDATE ... CASE over the rows that differ, committed on its own, and is yielded
+    # afterwards so the caller can checkpoint lastXrpId and resume from it. A dry run only reports differences
+    async def syncBattleWinsChunks(
+        self, chunkSize: int = 1000, afterXrpId: str | None = None, dryRun: bool = False
+    ):
+        while True:
+            async with self.asyncSessionMaker() as session:
+                async with session.begin():
+                    query = select(
+                        RewardsTable.xrpId,
+                        RewardsTable.tokenIdBattleNFT,
+                        RewardsTable.battleWins,
+                    ).filter(RewardsTable.tokenIdBattleNFT != "")
+
+                    if afterXrpId is not None:
+                        query = query.filter(RewardsTable.xrpId > afterXrpId)
+
+                    query = query.order_by(RewardsTable.xrpId).limit(chunkSize)
+                    entries = (await session.execute(query)).all()
+
+                    if not entries:
+                        return
+
+                    targetWins = {tokenId: battleWins for _, tokenId, battleWins in entries}
+                    query = select(NFTTraitList.tokenId, NFTTraitList.battleWins).filter(
+                        NFTTraitList.tokenId.in_(list(targetWins))
                     )
-                    (
-                        loggingInstance.info(
-                            f"addBoost({tokenId}, {battleWins}): Success"
+                    currentWins = dict((await session.execute(query)).all())
+
+                    differences = [
+                        (tokenId, currentWins[tokenId], battleWins)
+                        for tokenId, battleWins in targetWins.items()
+                        if tokenId in currentWins and currentWins[tokenId] != battleWins
+                    ]
+
+                    if differences and not dryRun:
+                        changedWins = {tokenId: battleWins for tokenId, _, battleWins in differences}
+                        await session.execute(
+                            update(NFTTraitList)
+                            .where(NFTTraitList.tokenId.in_(list(changedWins)))
+                            .values(
+                                battleWins=case(changedWins, value=NFTTraitList.tokenId)
+                            )
+                            .execution_options(synchronize_session=False)
                         )
-                        if self.verbose
-                        else None
-                    )
-        print("Done")
 
+            afterXrpId = entries[-1][0]
+            yield {
+                "lastXrpId": afterXrpId,
+                "rows": len(entries),
+                "changed": len(differences),
+                "missing": len(targetWins) - len(currentWins),
+                "differences": differences,
+            }
+
+            if len(entries) < chunkSize:
+                return
+
+    @staticmethod
+    def __profileQuery():
+        return select(
+            RewardsTable.xrpId,
+            RewardsTable.tokenIdBattleNFT,
+            RewardsTable.xrainPower,
+            RewardsTable.nftlink,
+            RewardsTable.reserveXRAIN,
+            RewardsTable.reserveBoosts,
+            RewardsTable.battleWins,
+            RewardsTable.nftGroupName,
+            RewardsTable.taxonId,
+            RewardsTable.discordId,
+        )
+
+    @staticmethod
+    def __profileFromRow(row, npc=False) -> dict:
+        (
+            xrpId,
+            tokenId,
+            xrainPower,
+            nftLink,
+            reserveXrain,
+            reserveBoosts,
+            battleWins,
+            nftGroupName,
+            taxonId,
+            _,
+        ) = row
+
+        return {
+            "xrpId": xrpId,
+            "nftToken": tokenId,
+            "xrainPower": xrainPower,
+            "nftLink": nftLink,
+            "reserveXrain": reserveXrain,
+            "reserveBoosts": reserveBoosts,
+            "battleWins": battleWins,
+            "battleRank": battleRank(battleWins),
+            "nftGroupName": nftGroupName,
+            "taxonId": taxonId,
+            "npc": npc,
+        }
+
+    @instrumented
     async def getNFTInfo(self, uniqueId="", npc=False):
+        # NPC picks are random, so only real players go through the cache
+        if npc:
+            profile, _ = await self.__queryNFTInfo(uniqueId, npc)
+            return profile
+
+        return await self.profileCache.get(
+            ("getNFTInfo", str(uniqueId)), lambda: self.__queryNFTInfo(uniqueId, npc)
+        )
+
+    async def __queryNFTInfo(self, uniqueId="", npc=False):
         async with self.asyncSessionMaker() as session:
 
-            query = select(
-                RewardsTable.xrpId,
-                RewardsTable.tokenIdBattleNFT,
-                RewardsTable.xrainPower,
-                RewardsTable.nftlink,
-                RewardsTable.reserveXRAIN,
-                RewardsTable.reserveBoosts,
-                RewardsTable.battleWins,
-                RewardsTable.nftGroupName,
-                RewardsTable.taxonId,
-            )
+            query = self.__profileQuery()
 
             if not npc:
                 query = query.filter(
@@ -91,49 +330,62 @@ class BattleRoyaleDB:
             if not sessionResult:
                 raise Exception("xrpIdNotFound")
 
-            (
-                xrpId,
-                tokenId,
-                xrainPower,
-                nftLink,
-                reserveXrain,
-                reserveBoosts,
-                battleWins,
-                nftGroupName,
-                taxonId,
-            ) = sessionResult
-
-            if battleWins >= 100:
-                battleRank = "Diamond Xrain King :gem::crown:"
-            elif battleWins < 10:
-                battleRank = "Rookie :punch:"
-            elif battleWins < 25:
-                battleRank = "Bronze Warrior :third_place:"
-            elif battleWins < 50:
-                battleRank = "Silver Xrain Lord :coin:"
-            elif battleWins < 100:
-                battleRank = "Golden Oracle Warlord :trident:"
-
             (
                 loggingInstance.info(f"getNFTInfo({uniqueId}): Success")
                 if self.verbose
                 else None
             )
 
-            return {
-                "xrpId": xrpId,
-                "nftToken": tokenId,
-                "xrainPower": xrainPower,
-                "nftLink": nftLink,
-                "reserveXrain": reserveXrain,
-                "reserveBoosts": reserveBoosts,
-                "battleWins": battleWins,
-                "battleRank": battleRank,
-                "nftGroupName": nftGroupName,
-                "taxonId": taxonId,
-                "npc": npc,
-            }
+            return self.__profileFromRow(sessionResult, npc), (
+                uniqueId,
+                sessionResult[0],
+                sessionResult[-1],
+            )
+
+    # Resolves a whole lobby in one query; every Discord ID ends up in either the profiles or the errors,
+    # with the same error names getNFTInfo and the /br join checks use
+    @instrumented
+    async def getPlayerProfiles(self, discordIds: list, wager: int = 0) -> tuple[dict, dict]:
+        lookupIds = list(dict.fromkeys(str(discordId) for discordId in discordIds))
+        profiles = {}
+        errors = {}
+
+        if not lookupIds:
+            return profiles, errors
+
+        async with self.asyncSessionMaker() as session:
+            query = self.__profileQuery().filter(RewardsTable.discordId.in_(lookupIds))
+            queryResult = await session.execute(query)
+            queryResult = queryResult.all()
+
+        for row in queryResult:
+            discordId = str(row[-1])
+            if discordId in profiles:
+                continue
+            profiles[discordId] = self.__profileFromRow(row)
+
+        for discordId in lookupIds:
+            profile = profiles.get(discordId)
+            if profile is None:
+                errors[discordId] = "xrpIdNotFound"
+            elif not profile["nftLink"]:
+                errors[discordId] = "BattleNFTNotFound"
+            elif (profile["reserveXrain"] or 0) < wager:
+                errors[discordId] = "insufficientCredits"
+            else:
+                continue
+            profiles.pop(discordId, None)
 
+        (
+            loggingInstance.info(
+                f"getPlayerProfiles({len(lookupIds)} ids): {len(profiles)} found, {len(errors)} rejected"
+            )
+            if self.verbose
+            else None
+        )
+        return profiles, errors
+
+    @instrumented
     async def setNFT(
         self, xrpId, token, nftLink, xrainPower, taxonId, groupName, battleWinArg
     ):
@@ -157,10 +409,19 @@ class BattleRoyaleDB:
                     else None
                 )
 
+        self.profileCache.invalidate(xrpId)
+
+    @instrumented
     async def getNFTOption(self, discordID):
+        return await self.profileCache.get(
+            ("getNFTOption", str(discordID)), lambda: self.__queryNFTOption(discordID)
+        )
+
+    async def __queryNFTOption(self, discordID):
         async with self.asyncSessionMaker() as session:
             query = (
                 select(
+                    RewardsTable.xrpId,
                     NFTTraitList.tokenId,
                     NFTTraitList.nftlink,
                     NFTTraitList.totalXRAIN,
@@ -187,15 +448,8 @@ class BattleRoyaleDB:
             nftOptions = {}
 
             for row in queryResult:
-                tokenId, nftLink, totalXrain, nftGroupName, taxonId, battleWins = row
-                entry = {
-                    "tokenId": tokenId,
-                    "nftLink": nftLink,
-                    "totalXrain": totalXrain,
-                    "taxonId": taxonId,
-                    "label": f"{nftGroupName} *{tokenId[-6:]} | XRAIN {totalXrain}",
-                    "battleWins": battleWins,
-                }
+                nftGroupName = row[4]
+                entry = self.__nftOptionEntry(row)
 
                 if not len(nftGroupName):
                     continue
@@ -211,8 +465,145 @@ class BattleRoyaleDB:
                 else None
             )
 
-            return nftOptions
+            return nftOptions, (discordID, queryResult[0][0])
+
+    @staticmethod
+    def __nftOptionEntry(row) -> dict:
+        _, tokenId, nftLink, totalXrain, nftGroupName, taxonId, battleWins = row
+        return {
+            "tokenId": tokenId,
+            "nftLink": nftLink,
+            "totalXrain": totalXrain,
+            "taxonId": taxonId,
+            "label": f"{nftGroupName} *{tokenId[-6:]} | XRAIN {totalXrain}",
+            "battleWins": battleWins,
+        }
+
+    # Group names and NFT counts only, for the first /choose-nft menu
+    @instrumented
+    async def getNFTGroupSummary(self, discordID) -> dict:
+        return await self.profileCache.get(
+            ("getNFTGroupSummary", str(discordID)),
+            lambda: self.__queryNFTGroupSummary(discordID),
+        )
+
+    async def __queryNFTGroupSummary(self, discordID):
+        async with self.asyncSessionMaker() as session:
+            query = (
+                select(
+                    RewardsTable.xrpId,
+                    NFTTraitList.nftGroupName,
+                    func.count(NFTTraitList.tokenId),
+                )
+                .join(RewardsTable, RewardsTable.xrpId == NFTTraitList.xrpId)
+                .filter(
+                    RewardsTable.discordId == discordID,
+                    NFTTraitList.nftlink != "",
+                    NFTTraitList.nftGroupName != "",
+                )
+                .group_by(RewardsTable.xrpId, NFTTraitList.nftGroupName)
+                .order_by(NFTTraitList.nftGroupName)
+            )
+            queryResult = await session.execute(query)
+            queryResult = queryResult.all()
+
+            if not queryResult:
+                (
+                    loggingInstance.error(f"getNFTGroupSummary({discordID}): xrpIdNotFound")
+                    if self.verbose
+                    else None
+                )
+                raise Exception("xrpIdNotFound")
+
+            (
+                loggingInstance.info(f"getNFTGroupSummary({discordID}): {len(queryResult)} groups")
+                if self.verbose
+                else None
+            )
+            return {
+                nftGroupName: count for _, nftGroupName, count in queryResult
+            }, (discordID, queryResult[0][0])
+
+    # One page of a group ordered by totalXRAIN, highest first. The cursor is the (totalXrain, tokenId) of the
+    # last entry of the previous page, so a page costs the same no matter how deep into the group it is
+    @instrumented
+    async def getNFTGroupPage(
+        self, discordID, groupName, cursor: tuple | None = None, limit: int = 25
+    ) -> tuple[list, tuple | None]:
+        return await self.profileCache.get(
+            ("getNFTGroupPage", str(discordID), groupName, cursor, limit),
+            lambda: self.__queryNFTGroupPage(discordID, groupName, cursor, limit),
+        )
+
+    async def __queryNFTGroupPage(self, discordID, groupName, cursor, limit):
+        async with self.asyncSessionMaker() as session:
+            query = (
+                select(
+                    RewardsTable.xrpId,
+                    NFTTraitList.tokenId,
+                    NFTTraitList.nftlink,
+                    NFTTraitList.totalXRAIN,
+                    NFTTraitList.nftGroupName,
+                    NFTTraitList.taxonId,
+                    NFTTraitList.battleWins,
+                )
+                .join(RewardsTable, RewardsTable.xrpId == NFTTraitList.xrpId)
+                .filter(
+                    RewardsTable.discordId == discordID,
+                    NFTTraitList.nftGroupName == groupName,
+                    NFTTraitList.nftlink != "",
+                )
+            )
+
+            # totalXRAIN is nullable; NULL compares as nothing, so those NFTs are paged as 0
+            totalXrainKey = func.coalesce(NFTTraitList.totalXRAIN, 0)
+
+            if cursor is not None:
+                totalXrain, tokenId = cursor
+                query = query.filter(
+                    or_(
+                        totalXrainKey < totalXrain,
+                        and_(
+                            totalXrainKey == totalXrain,
+                            NFTTraitList.tokenId > tokenId,
+                        ),
+                    )
+                )
+
+            # One extra row tells whether another page follows
+            query = query.order_by(
+                totalXrainKey.desc(), NFTTraitList.tokenId
+            ).limit(limit + 1)
+            queryResult = await session.execute(query)
+            queryResult = queryResult.all()
+
+            # An empty page is cached too, so it still needs the owner's xrpId for setNFT/addWin to drop it
+            if queryResult:
+                xrpIds = [queryResult[0][0]]
+            else:
+                xrpIds = (
+                    await session.execute(
+                        select(RewardsTable.xrpId).filter(RewardsTable.discordId == discordID)
+                    )
+                ).scalars().all()
+
+            entries = [self.__nftOptionEntry(row) for row in queryResult[:limit]]
+            nextCursor = (
+                (entries[-1]["totalXrain"] or 0, entries[-1]["tokenId"])
+                if len(queryResult) > limit
+                else None
+            )
+
+            (
+                loggingInstance.info(
+                    f"getNFTGroupPage({discordID}, {groupName}, {cursor}): {len(entries)} entries"
+                )
+                if self.verbose
+                else None
+            )
+            return (entries, nextCursor), (discordID, *xrpIds)
 
+    @instrumented
     async def addWin(self, xrpId, tokenId, isNPC):
         async with self.asyncSessionMaker() as session:
             async with session.begin():
@@ -245,6 +636,69 @@ class BattleRoyaleDB:
                         else None
                     )
 
+        self.profileCache.invalidate(xrpId)
+
+    # Merged counter updates from StatWriteBehind: wins per xrpId, NFT wins per (tokenId, xrpId) and boosts
+    # claimed per xrpId, applied with one UPDATE per table in a single transaction
+    @instrumented
+    async def applyCounterBatch(self, rewardWins: dict, nftWins: dict, boostClaims: dict):
+        xrpIds = list(dict.fromkeys([*rewardWins, *boostClaims]))
+
+        async with self.asyncSessionMaker() as session:
+            async with session.begin():
+                if xrpIds:
+                    values = {}
+                    if rewardWins:
+                        values["battleWins"] = RewardsTable.battleWins + case(
+                            rewardWins, value=RewardsTable.xrpId, else_=0
+                        )
+                    if boostClaims:
+                        values["reserveBoosts"] = RewardsTable.reserveBoosts - case(
+                            boostClaims, value=RewardsTable.xrpId, else_=0
+                        )
+
+                    await session.execute(
+                        update(RewardsTable)
+                        .where(RewardsTable.xrpId.in_(xrpIds))
+                        .values(**values)
+                        .execution_options(synchronize_session=False)
+                    )
+
+                if nftWins:
+                    await session.execute(
+                        update(NFTTraitList)
+                        .where(
+                            NFTTraitList.tokenId.in_(list({tokenId for tokenId, _ in nftWins}))
+                        )
+                        .values(
+                            battleWins=NFTTraitList.battleWins
+                            + case(
+                                *[
+                                    (
+                                        and_(
+                                            NFTTraitList.tokenId == tokenId,
+                                            NFTTraitList.xrpId == xrpId,
+                                        ),
+                                        wins,
+                                    )
+                                    for (tokenId, xrpId), wins in nftWins.items()
+                                ],
+                                else_=0,
+                            )
+                        )
+                        .execution_options(synchronize_session=False)
+                    )
+
+        (
+            loggingInstance.info(
+                f"applyCounterBatch(): {len(rewardWins)} wins, {len(nftWins)} NFT wins, {len(boostClaims)} boosts"
+            )
+            if self.verbose
+            else None
+        )
+        self.profileCache.invalidate(*xrpIds, *[xrpId for _, xrpId in nftWins])
+
+    @instrumented
     async def addBoost(self, uniqueId, boost):
         async with self.asyncSessionMaker() as session:
             async with session.begin():
@@ -264,6 +718,9 @@ class BattleRoyaleDB:
                     else None
                 )
 
+        self.profileCache.invalidate(uniqueId)
+
+    @instrumented
     async def addXrain(self, uniqueId, xrain):
         async with self.asyncSessionMaker() as session:
             async with session.begin():
@@ -283,6 +740,9 @@ class BattleRoyaleDB:
                     else None
                 )
 
+        self.profileCache.invalidate(uniqueId)
+
+    @instrumented
     async def placeWager(self, xrpId, xrain):
         async with self.asyncSessionMaker() as session:
             async with session.begin():
@@ -297,6 +757,9 @@ class BattleRoyaleDB:
                     else None
                 )
 
+        self.profileCache.invalidate(xrpId)
+
+    @instrumented
     async def claimBoost(self, xrpId):
         async with self.asyncSessionMaker() as session:
             async with session.begin():
@@ -311,6 +774,88 @@ class BattleRoyaleDB:
                     else None
                 )
 
+        self.profileCache.invalidate(xrpId)
+
+    # Takes every wager of a lobby and consumes the boosts in one transaction. The rows are locked first,
+    # and the UPDATE still only touches reserves that cover the wager, so two lobbies cannot spend the same XRAIN.
+    # Only the boosts returned in boosted were actually paid for
+    @instrumented
+    async def settleLobby(self, xrpIds: list, wager: int, boostIds: list | None = None) -> tuple[list, dict, list]:
+        lookupIds = list(dict.fromkeys(xrpIds))
+        boostIds = [xrpId for xrpId in dict.fromkeys(boostIds or []) if xrpId in lookupIds]
+        rejected = {}
+
+        boostedIds = []
+
+        if not lookupIds:
+            return [], rejected, boostedIds
+
+        async with self.asyncSessionMaker() as session:
+            async with session.begin():
+                query = (
+                    select(RewardsTable.xrpId, RewardsTable.reserveXRAIN, RewardsTable.reserveBoosts)
+                    .filter(RewardsTable.xrpId.in_(lookupIds))
+                    .with_for_update()
+                )
+                queryResult = await session.execute(query)
+                reserves = {xrpId: (reserveXRAIN, reserveBoosts) for xrpId, reserveXRAIN, reserveBoosts in queryResult.all()}
+
+                for xrpId in lookupIds:
+                    if xrpId not in reserves:
+                        rejected[xrpId] = "xrpIdNotFound"
+                    elif (reserves[xrpId][0] or 0) < wager:
+                        rejected[xrpId] = "insufficientCredits"
+
+                accepted = [xrpId for xrpId in lookupIds if xrpId not in rejected]
+
+                if accepted:
+                    boostedIds = [xrpId for xrpId in boostIds if xrpId in accepted and (reserves[xrpId][1] or 0) > 0]
+                    reserveBoosts = (
+                        case(
+                            (
+                                and_(
+                                    RewardsTable.xrpId.in_(boostedIds),
+                                    RewardsTable.reserveBoosts > 0,
+                                ),
+                                RewardsTable.reserveBoosts - 1,
+                            ),
+                            else_=RewardsTable.reserveBoosts,
+                        )
+                        if boostedIds
+                        else RewardsTable.reserveBoosts
+                    )
+
+                    updateResult = await session.execute(
+                        update(RewardsTable)
+                        .where(
+                            RewardsTable.xrpId.in_(accepted),
+                            RewardsTable.reserveXRAIN >= wager,
+                        )
+                        .values(
+                            reserveXRAIN=RewardsTable.reserveXRAIN - wager,
+                            reserveBoosts=reserveBoosts,
+                        )
+                        .execution_options(synchronize_session=False)
+                    )
+
+                    # The locked rows cannot change underneath us; anything else rolls the whole lobby back
+                    if updateResult.rowcount != len(accepted):
+                        loggingInstance.error(
+                            f"settleLobby({len(lookupIds)} players): {updateResult.rowcount} of {len(accepted)} wagers placed"
+                        )
+                        raise Exception("LobbySettlementError")
+
+        (
+            loggingInstance.info(
+                f"settleLobby({len(lookupIds)} players, {wager}): {len(accepted)} accepted, {len(rejected)} rejected, {len(boostedIds)} boosted"
+            )
+            if self.verbose
+            else None
+        )
+        self.profileCache.invalidate(*accepted)
+        return accepted, rejected, boostedIds
+
+    @instrumented
     async def getRandomQuote(self, revival: bool = False):
         async with self.asyncSessionMaker() as session:
             query = (
@@ -329,7 +874,67 @@ class BattleRoyaleDB:
 
             return queryResult
 
+    @instrumented
+    async def getBattleProfiles(self, xrpIds: list | None = None, limit: int | None = None):
+        async with self.asyncSessionMaker() as session:
+            query = select(
+                RewardsTable.xrpId,
+                RewardsTable.battleWins,
+                RewardsTable.xrainPower,
+                RewardsTable.reserveBoosts,
+            ).filter(RewardsTable.tokenIdBattleNFT != "", RewardsTable.nftlink != "")
+
+            if xrpIds:
+                query = query.filter(RewardsTable.xrpId.in_(xrpIds))
+
+            if limit:
+                query = query.order_by(RewardsTable.battleWins.desc()).limit(limit)
+
+            queryResult = await session.execute(query)
+            queryResult = queryResult.all()
+
+            (
+                loggingInstance.info(f"getBattleProfiles(): {len(queryResult)} players")
+                if self.verbose
+                else None
+            )
+            return [
+                {
+                    "xrpId": xrpId,
+                    "battleWins": battleWins or 0,
+                    "xrainPower": xrainPower or 0,
+                    "reserveBoosts": reserveBoosts or 0,
+                }
+                for xrpId, battleWins, xrainPower, reserveBoosts in queryResult
+            ]
+
+    @instrumented
+    async def getAllQuotes(self):
+        async with self.asyncSessionMaker() as session:
+            # Ordered so a seeded battle draws the same quotes on every load
+            query = select(
+                BattleQuotes.quoteId, BattleQuotes.quoteType, BattleQuotes.quoteDesc
+            ).order_by(BattleQuotes.quoteId)
+            queryResult = await session.execute(query)
+            queryResult = queryResult.all()
+
+            if not queryResult:
+                raise Exception("RandomQuoteGetError")
+
+            (
+                loggingInstance.info(f"getAllQuotes(): {len(queryResult)} quotes")
+                if self.verbose
+                else None
+            )
+            return queryResult
+
+    @instrumented
     async def checkDiscordId(self, discordId):
+        return await self.profileCache.get(
+            ("checkDiscordId", str(discordId)), lambda: self.__queryDiscordId(discordId)
+        )
+
+    async def __queryDiscordId(self, discordId):
         async with self.asyncSessionMaker() as session:
             query = select(RewardsTable.discordId, RewardsTable.xrpId).filter(
                 RewardsTable.discordId == discordId
@@ -352,8 +957,9 @@ class BattleRoyaleDB:
                 if self.verbose
                 else None
             )
-            return queryResult[1]
+            return queryResult[1], queryResult
 
+    @instrumented
     async def setDiscordId(self, discordId, xrpId):
         async with self.asyncSessionMaker() as session:
             async with session.begin():
@@ -390,6 +996,43 @@ class BattleRoyaleDB:
                     else None
                 )
 
+        self.profileCache.invalidate(discordId, xrpId, checkQueryResult[0] if checkQueryResult is not None else None)
+
+    @instrumented
+    async def getAllClaimQuotes(self):
+        async with self.asyncSessionMaker() as session:
+            query = select(
+                ClaimQuotes.taxonId, ClaimQuotes.nftGroupName, ClaimQuotes.description
+            ).order_by(ClaimQuotes.quoteId)
+            queryResult = await session.execute(query)
+            queryResult = queryResult.all()
+
+            (
+                loggingInstance.info(f"getAllClaimQuotes(): {len(queryResult)} quotes")
+                if self.verbose
+                else None
+            )
+            return queryResult
+
+    @instrumented
+    async def getNPCProfiles(self) -> list:
+        async with self.asyncSessionMaker() as session:
+            query = (
+                self.__profileQuery()
+                .filter(RewardsTable.xrpId.like("npcPlayer%"))
+                .order_by(RewardsTable.xrpId)
+            )
+            queryResult = await session.execute(query)
+            queryResult = queryResult.all()
+
+            (
+                loggingInstance.info(f"getNPCProfiles(): {len(queryResult)} NPCs")
+                if self.verbose
+                else None
+            )
+            return [self.__profileFromRow(row, npc=True) for row in queryResult]
+
+    @instrumented
     async def getClaimQuote(self, taxonId) -> dict:
         async with self.asyncSessionMaker() as session:
             # Query the rows of taxonId
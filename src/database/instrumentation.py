@@ -0,0 +1,179 @@
+from components.logging import loggingInstance
+
+from asyncio import Task, create_task, sleep
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Upper bounds of the latency histogram buckets, in milliseconds; the last bucket is open ended
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class MethodStats:
+    # calls and the histogram only cover calls that reached the database; ones answered from the
+    # ProfileCache are counted in cacheHits
+    __slots__ = ('name', 'calls', 'cacheHits', 'errors', 'totalSeconds', 'maxSeconds', 'histogram',
+                 'statements', 'rows', 'checkouts', 'checkoutSeconds', 'maxCheckoutSeconds')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.cacheHits = 0
+        self.errors = 0
+        self.totalSeconds = 0.0
+        self.maxSeconds = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.statements = 0
+        self.rows = 0
+        self.checkouts = 0
+        self.checkoutSeconds = 0.0
+        self.maxCheckoutSeconds = 0.0
+
+    def record(self, seconds: float):
+        self.calls += 1
+        self.totalSeconds += seconds
+        self.maxSeconds = max(self.maxSeconds, seconds)
+        self.histogram[bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)] += 1
+
+    def recordCheckout(self, seconds: float):
+        self.checkouts += 1
+        self.checkoutSeconds += seconds
+        self.maxCheckoutSeconds = max(self.maxCheckoutSeconds, seconds)
+
+    # Upper bound of the bucket the share-th call falls into, never above the slowest call seen
+    def percentileMs(self, share: float) -> float:
+        target = share * self.calls
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= target:
+                return min(LATENCY_BUCKETS_MS[bucket] if bucket < len(LATENCY_BUCKETS_MS) else float("inf"), self.maxSeconds * 1000)
+        return 0.0
+
+    def asDict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "cacheHits": self.cacheHits,
+            "errors": self.errors,
+            "meanMs": self.totalSeconds * 1000 / self.calls if self.calls else 0.0,
+            "p50Ms": self.percentileMs(0.50),
+            "p95Ms": self.percentileMs(0.95),
+            "p99Ms": self.percentileMs(0.99),
+            "maxMs": self.maxSeconds * 1000,
+            "histogram": dict(zip([*map(str, LATENCY_BUCKETS_MS), "inf"], self.histogram)),
+            "statements": self.statements,
+            "rows": self.rows,
+            "checkouts": self.checkouts,
+            "checkoutWaitMs": self.checkoutSeconds * 1000,
+            "maxCheckoutWaitMs": self.maxCheckoutSeconds * 1000,
+        }
+
+
+class MethodCall:
+    # One running call of a method; queried is set once it checks out a connection or runs a statement
+    __slots__ = ('stats', 'queried')
+
+    def __init__(self, stats: MethodStats):
+        self.stats = stats
+        self.queried = False
+
+
+# The BattleRoyaleDB call running in this task; engine and pool events charge their work to it
+currentCall: ContextVar[MethodCall | None] = ContextVar('currentCall', default=None)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    # Checkout time, waiting for a free connection or opening a new one, goes to the running method
+    def connect(self):
+        start = perf_counter()
+        try:
+            return super().connect()
+        finally:
+            call = currentCall.get()
+            if call is not None:
+                call.queried = True
+                call.stats.recordCheckout(perf_counter() - start)
+
+
+class QueryStats:
+    # Per-method call counts, latency histogram, statements, rows and checkout wait for BattleRoyaleDB
+    def __init__(self):
+        self.methods: dict[str, MethodStats] = {}
+        self.summaryTask: Task | None = None
+
+    def method(self, name: str) -> MethodStats:
+        stats = self.methods.get(name)
+        if stats is None:
+            stats = self.methods[name] = MethodStats(name)
+        return stats
+
+    # cursor.rowcount is filled for SELECTs by MySQL's buffered cursors; SQLite only reports it for writes
+    def attach(self, dbEngine: AsyncEngine):
+        @event.listens_for(dbEngine.sync_engine, "after_cursor_execute")
+        def afterCursorExecute(connection, cursor, statement, parameters, context, executemany):
+            call = currentCall.get()
+            if call is not None:
+                call.queried = True
+                call.stats.statements += 1
+                if cursor.rowcount > 0:
+                    call.stats.rows += cursor.rowcount
+
+    def snapshot(self) -> dict:
+        return {name: stats.asDict() for name, stats in self.methods.items()}
+
+    def summary(self, top: int = 10) -> str:
+        ranked = sorted(self.methods.values(), key=lambda stats: stats.totalSeconds, reverse=True)[:top]
+        return "; ".join(
+            f"{stats.name} {stats.calls} calls {stats.cacheHits} cached p50 {stats.percentileMs(0.5):g}ms p99 {stats.percentileMs(0.99):g}ms "
+            f"max {stats.maxSeconds * 1000:.0f}ms rows {stats.rows} wait {stats.checkoutSeconds * 1000:.0f}ms"
+            for stats in ranked
+        )
+
+    async def __summaryLoop(self, interval: float):
+        while True:
+            await sleep(interval)
+            loggingInstance.info(f"DB stats: {self.summary()}") if self.methods else None
+
+    def startSummaryLog(self, interval: float):
+        if interval > 0 and (self.summaryTask is None or self.summaryTask.done()):
+            self.summaryTask = create_task(self.__summaryLoop(interval))
+
+    def stopSummaryLog(self):
+        if self.summaryTask is not None:
+            self.summaryTask.cancel()
+            self.summaryTask = None
+
+
+# For BattleRoyaleDB coroutine methods; the instance carries the QueryStats as self.queryStats
+def instrumented(method):
+    name = method.__name__
+
+    @wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        call = MethodCall(self.queryStats.method(name))
+        token = currentCall.set(call)
+        start = perf_counter()
+        failed = False
+        try:
+            return await method(self, *args, **kwargs)
+        except BaseException:
+            failed = True
+            call.stats.errors += 1
+            raise
+        finally:
+            currentCall.reset(token)
+            if call.queried or failed:
+                call.stats.record(perf_counter() - start)
+            else:
+                call.stats.cacheHits += 1
+            # A method that only delegates still reached the database through the inner call
+            outer = currentCall.get()
+            if call.queried and outer is not None:
+                outer.queried = True
+
+    return wrapper
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, VARCHAR, Date
+from sqlalchemy import Column, Integer, DateTime, VARCHAR, Date, Index
 from sqlalchemy.orm import column_property
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -9,6 +9,7 @@ Base = declarative_base()
 
 class BattleQuotes(Base):
     __tablename__ = dbConfig['quotes_table_name']
+    __table_args__ = (Index('ix_battlequotes_quoteType', 'quoteType'),)
 
     quoteId = Column(Integer, primary_key=True)
     quoteType = Column(VARCHAR)
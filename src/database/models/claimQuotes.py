@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, VARCHAR
+from sqlalchemy import Column, Integer, VARCHAR, Index
 from sqlalchemy.orm import column_property
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -9,6 +9,7 @@ Base = declarative_base()
 
 class ClaimQuotes(Base):
     __tablename__ = dbConfig['claim_quotes_table_name']
+    __table_args__ = (Index('ix_claimquotes_taxonId', 'taxonId'),)
 
     quoteId = Column(Integer, index=True, primary_key=True)
     nftGroupName = column_property(Column('NFTGroupName', VARCHAR))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, VARCHAR, Date
+from sqlalchemy import Column, Integer, VARCHAR, Date, Index
 from sqlalchemy.orm import column_property
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -10,6 +10,12 @@ Base = declarative_base()
 
 class NFTTraitList(Base):
     __tablename__ = dbConfig["nft_trait_list_table_name"]
+    __table_args__ = (
+        # Owner joins plus the per-group pages ordered by totalXRAIN
+        Index("ix_nfttraitlist_xrpId_group_xrain", "xrpId", "NFTGroupName", "totalXRAIN"),
+        # addWin matches on both
+        Index("ix_nfttraitlist_tokenId_xrpId", "tokenId", "xrpId"),
+    )
 
     uri = Column(VARCHAR, primary_key=True)
     tokenId = Column(VARCHAR, index=True)
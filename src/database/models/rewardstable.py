@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, VARCHAR
+from sqlalchemy import Column, Integer, DateTime, VARCHAR, Index
 from sqlalchemy.orm import column_property
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -9,6 +9,8 @@ Base = declarative_base()
 
 class RewardsTable(Base):
     __tablename__ = dbConfig['rewards_table_name']
+    # xrpId is the primary key, which also serves the npcPlayer% prefix scans
+    __table_args__ = (Index('ix_rewards_discordId', 'discordId'),)
 
     xrpId = Column(VARCHAR, primary_key=True)
     OGReputationRewards = Column(Integer)
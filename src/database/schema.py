@@ -0,0 +1,128 @@
+from database.models import BattleQuotes, NFTTraitList, RewardsTable, ClaimQuotes
+from components.logging import loggingInstance
+
+from sqlalchemy import inspect, update, and_, func, Index
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.future import select
+from sqlalchemy.schema import CreateIndex
+
+SCHEMA_MODELS = (RewardsTable, NFTTraitList, BattleQuotes, ClaimQuotes)
+
+
+# The shapes of the hot queries in BattleRoyaleDB, with sample values, for EXPLAIN
+def hotQueries() -> dict:
+    return {
+        "profile by discordId": select(RewardsTable.xrpId).filter(RewardsTable.discordId == "0"),
+        "NPC roster": select(RewardsTable.xrpId).filter(RewardsTable.xrpId.like("npcPlayer%")),
+        "NFT group page": (
+            select(NFTTraitList.tokenId, NFTTraitList.totalXRAIN)
+            .join(RewardsTable, RewardsTable.xrpId == NFTTraitList.xrpId)
+            .filter(RewardsTable.discordId == "0", NFTTraitList.nftGroupName == "group")
+            .order_by(func.coalesce(NFTTraitList.totalXRAIN, 0).desc(), NFTTraitList.tokenId)
+            .limit(26)
+        ),
+        "addWin": (
+            update(NFTTraitList)
+            .where(and_(NFTTraitList.tokenId == "0", NFTTraitList.xrpId == "0"))
+            .values(battleWins=NFTTraitList.battleWins + 1)
+        ),
+        "quotes by type": select(BattleQuotes.quoteId).filter(BattleQuotes.quoteType == "Revival"),
+        "claim quotes by taxon": select(ClaimQuotes.quoteId).filter(ClaimQuotes.taxonId == 0),
+    }
+
+
+class SchemaReport:
+    def __init__(self):
+        self.missingTables: list[str] = []
+        self.missingIndexes: list[Index] = []
+        self.ddl: list[str] = []
+        self.fullScans: dict[str, list[str]] = {}
+
+    @property
+    def healthy(self) -> bool:
+        return not (self.missingTables or self.missingIndexes or self.fullScans)
+
+
+class SchemaVerifier:
+    # Compares the live tables named in dbConfig with the indexes declared on the models,
+    # and EXPLAINs the hot queries to catch full scans the index check cannot see
+    def __init__(self, dbEngine: AsyncEngine):
+        self.dbEngine = dbEngine
+
+    @staticmethod
+    def __liveIndexes(connection) -> dict[str, list[tuple[str, ...]] | None]:
+        inspector = inspect(connection)
+        liveIndexes = {}
+        for model in SCHEMA_MODELS:
+            tableName = model.__table__.name
+            if not inspector.has_table(tableName):
+                liveIndexes[tableName] = None
+                continue
+
+            columnSets = [tuple(index["column_names"]) for index in inspector.get_indexes(tableName)]
+            columnSets.append(tuple(inspector.get_pk_constraint(tableName)["constrained_columns"]))
+            liveIndexes[tableName] = columnSets
+        return liveIndexes
+
+    # Any live index whose leading columns match serves the declared one, whatever its name
+    @staticmethod
+    def __covered(columns: tuple[str, ...], columnSets: list[tuple[str, ...]]) -> bool:
+        return any(columnSet[:len(columns)] == columns for columnSet in columnSets)
+
+    async def __explain(self, connection, statement) -> list[str]:
+        dialect = self.dbEngine.dialect
+        sql = str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+        if dialect.name == "sqlite":
+            plan = (await connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")).all()
+            return [row[-1] for row in plan if str(row[-1]).startswith("SCAN") and "USING" not in str(row[-1])]
+
+        plan = (await connection.exec_driver_sql(f"EXPLAIN {sql}")).mappings().all()
+        return [f"{row['table']} (type ALL)" for row in plan if row.get("type") == "ALL"]
+
+    async def verify(self, explain: bool = True) -> SchemaReport:
+        report = SchemaReport()
+
+        async with self.dbEngine.connect() as connection:
+            liveIndexes = await connection.run_sync(self.__liveIndexes)
+
+            for model in SCHEMA_MODELS:
+                table = model.__table__
+                if liveIndexes[table.name] is None:
+                    report.missingTables.append(table.name)
+                    continue
+
+                for index in table.indexes:
+                    columns = tuple(column.name for column in index.columns)
+                    if not self.__covered(columns, liveIndexes[table.name]):
+                        report.missingIndexes.append(index)
+                        report.ddl.append(str(CreateIndex(index).compile(dialect=self.dbEngine.dialect)).strip() + ";")
+
+            if explain and not report.missingTables:
+                for name, statement in hotQueries().items():
+                    try:
+                        scans = await self.__explain(connection, statement)
+                    except Exception as e:
+                        loggingInstance.error(f"SchemaVerifier EXPLAIN {name} failed: {e}")
+                        continue
+                    if scans:
+                        report.fullScans[name] = scans
+
+        for tableName in report.missingTables:
+            loggingInstance.warning(f"Schema: table {tableName} not found")
+        for ddl in report.ddl:
+            loggingInstance.warning(f"Schema: missing index, run {ddl}")
+        for name, scans in report.fullScans.items():
+            loggingInstance.warning(f"Schema: {name} does a full scan of {', '.join(scans)}")
+
+        return report
+
+    async def apply(self, report: SchemaReport) -> int:
+        async with self.dbEngine.begin() as connection:
+            for index in report.missingIndexes:
+                await connection.run_sync(index.create)
+                loggingInstance.info(f"Schema: created index {index.name} on {index.table.name}")
+
+        # Pooled connections may keep statements prepared against the old schema
+        await self.dbEngine.dispose()
+        return len(report.missingIndexes)
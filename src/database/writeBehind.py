@@ -0,0 +1,116 @@
+from database.db import BattleRoyaleDB
+from components.config import dbConfig
+from components.logging import loggingInstance
+
+from asyncio import Event, Lock, Task, create_task, sleep, wait_for, TimeoutError
+
+
+class StatWriteBehind:
+    # Collects counter updates that nothing reads back right away (battle wins, boost claims), merges
+    # updates to the same key and writes them as one transaction per flush. A flush runs every
+    # flushInterval seconds or as soon as maxPending keys are waiting; stop() drains everything
+    def __init__(self, dbInstance: BattleRoyaleDB, flushInterval: float | None = None, maxPending: int | None = None):
+        self.dbInstance = dbInstance
+        self.flushInterval = flushInterval if flushInterval is not None else dbConfig.getfloat('write_behind_interval', fallback=5)
+        self.maxPending = maxPending if maxPending is not None else dbConfig.getint('write_behind_max_pending', fallback=100)
+        self.rewardWins: dict[str, int] = {}
+        self.nftWins: dict[tuple[str, str], int] = {}
+        self.boostClaims: dict[str, int] = {}
+        self.flushLock = Lock()
+        self.wakeEvent = Event()
+        self.flushTask: Task | None = None
+        self.stopping = False
+        self.flushes = 0
+        self.updatesMerged = 0
+        self.verbose = dbConfig.getboolean('verbose')
+
+    @property
+    def pendingCount(self) -> int:
+        return len(self.rewardWins) + len(self.nftWins) + len(self.boostClaims)
+
+    def __queued(self):
+        self.updatesMerged += 1
+        if self.pendingCount >= self.maxPending:
+            self.wakeEvent.set()
+
+    # Same arguments as BattleRoyaleDB.addWin
+    def addWin(self, xrpId, tokenId, isNPC):
+        self.rewardWins[xrpId] = self.rewardWins.get(xrpId, 0) + 1
+        if not isNPC:
+            self.nftWins[(tokenId, xrpId)] = self.nftWins.get((tokenId, xrpId), 0) + 1
+        self.__queued()
+
+    def claimBoost(self, xrpId):
+        self.boostClaims[xrpId] = self.boostClaims.get(xrpId, 0) + 1
+        self.__queued()
+
+    def __merge(self, target: dict, source: dict):
+        for key, count in source.items():
+            target[key] = target.get(key, 0) + count
+
+    async def flush(self) -> int:
+        async with self.flushLock:
+            if not self.pendingCount:
+                return 0
+
+            # Updates queued while this batch is written land in the fresh dicts
+            rewardWins, self.rewardWins = self.rewardWins, {}
+            nftWins, self.nftWins = self.nftWins, {}
+            boostClaims, self.boostClaims = self.boostClaims, {}
+
+            try:
+                await self.dbInstance.applyCounterBatch(rewardWins, nftWins, boostClaims)
+            except BaseException:
+                # Nothing was committed, so the batch goes back in front of whatever arrived meanwhile
+                self.__merge(self.rewardWins, rewardWins)
+                self.__merge(self.nftWins, nftWins)
+                self.__merge(self.boostClaims, boostClaims)
+                raise
+
+            self.flushes += 1
+            flushed = len(rewardWins) + len(nftWins) + len(boostClaims)
+            loggingInstance.info(f"StatWriteBehind flushed {flushed} keys") if self.verbose else None
+            return flushed
+
+    async def __flushLoop(self):
+        while not self.stopping:
+            try:
+                await wait_for(self.wakeEvent.wait(), timeout=self.flushInterval)
+            except TimeoutError:
+                pass
+            self.wakeEvent.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                loggingInstance.error(f"StatWriteBehind flush failed, retrying next interval: {e}")
+
+    def start(self):
+        self.stopping = False
+        if self.flushTask is None or self.flushTask.done():
+            self.flushTask = create_task(self.__flushLoop())
+
+    # Lets a flush in progress finish rather than cancelling it mid-commit, then flushes until the queue is empty
+    async def stop(self, retries: int = 5):
+        self.stopping = True
+        self.wakeEvent.set()
+        if self.flushTask is not None:
+            await self.flushTask
+            self.flushTask = None
+
+        for attempt in range(retries):
+            try:
+                await self.flush()
+                return
+            except Exception as e:
+                loggingInstance.error(f"StatWriteBehind drain failed ({attempt + 1}/{retries}): {e}")
+                await sleep(2 ** attempt)
+
+        loggingInstance.error(f"StatWriteBehind lost updates: wins {self.rewardWins}, NFT wins {self.nftWins}, boosts {self.boostClaims}")
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pendingCount,
+            "flushes": self.flushes,
+            "updatesMerged": self.updatesMerged,
+        }
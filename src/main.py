@@ -1,11 +1,21 @@
 from database.db import BattleRoyaleDB
+from database.schema import SchemaVerifier
+from database.writeBehind import StatWriteBehind
 from components.config import dbConfig, botConfig, coinsConfig, gameConfig, xrplConfig
 from components.logging import loggingInstance
 from components.xummClient import XummClient, XummGetPayloadResponse
 from components.xrplCommands import XRPClient
 
 from components.battles import Battle
-from components.players import Players
+from components.players import Players, PlayerStore
+from components.bracket import Bracket, HeatResult
+from components.quoteDeck import QuoteDeck
+from components.pools import ClaimQuotePool, NPCPool
+from components.quoteTemplates import escapeMarkdown, formatName
+from components.scheduler import BattleScheduler
+from components.imageFetcher import ImageFetcher
+from components.imageCache import ImageCache
+from components.collage import CollageAtlas, CollageRenderer
 
 from interactions import Intents, Client, listen, InteractionContext, BaseMessage # General discord Interactions import
 from interactions import slash_command, Button, slash_int_option, File, ActionRow # Slash command imports
@@ -14,23 +24,33 @@ from interactions.api.events import Component
 
 # Other imports
 from datetime import datetime
+from time import monotonic
 from random import randint, random
-from asyncio import sleep, gather, CancelledError
-from PIL import Image
-import requests
+from asyncio import sleep, gather, run, CancelledError
 from io import BytesIO
+import os
 
 intents = Intents.DEFAULT | Intents.MESSAGE_CONTENT
 client = Client(intents=intents, token=botConfig['token'])
 
 # Initialize DB connection
-dbInstance = BattleRoyaleDB(
-    host=dbConfig['db_server'],
-    dbName=dbConfig['db_name'],
-    username=dbConfig['db_username'],
-    password=dbConfig['db_password'],
-    verbose=dbConfig.getboolean('verbose')
-)
+dbInstance = BattleRoyaleDB.fromConfig()
+
+quoteDeck = QuoteDeck(dbInstance)
+
+statWriter = StatWriteBehind(dbInstance)
+
+claimQuotePool = ClaimQuotePool(dbInstance)
+
+npcPool = NPCPool(dbInstance)
+
+battleScheduler = BattleScheduler()
+
+imageFetcher = ImageFetcher()
+
+imageCache = ImageCache(imageFetcher)
+
+collageRenderer = CollageRenderer()
 
 xrplInstance = XRPClient(xrplConfig)
 
@@ -41,14 +61,21 @@ botVerbosity = botConfig.getboolean('verbose')
 @listen()
 async def on_ready():
     # Some function to do when the bot is ready
+    # Missing indexes and full scans are only logged here; schemaCheck.py --apply creates the indexes
+    if dbConfig.getboolean('verify_schema', fallback=True):
+        try:
+            await SchemaVerifier(dbInstance.dbEngine).verify()
+        except Exception as e:
+            loggingInstance.error(f"Schema check failed: {e}")
+    
+    for pool in (quoteDeck, claimQuotePool, npcPool):
+        await pool.refresh()
+        pool.startRefresh()
+    
+    statWriter.start()
+    dbInstance.queryStats.startSummaryLog(dbConfig.getfloat('query_stats_interval', fallback=300))
     loggingInstance.info(f"Discord Bot Ready!")
 
-def escapeMarkdown(text: str) -> str:
-    escapeChars = ['*', '_', '~', '`']
-    for char in escapeChars:
-        text = text.replace(char, f'\\{char}')
-    return text
-
 async def xummWaitForCompletion(uuid: str):
     status = xummInstance.checkStatus(uuid)
     while status.hex is None:
@@ -147,14 +174,14 @@ async def chooseNft(ctx: InteractionContext):
             return
     
     try:
-        nftOptions = await dbInstance.getNFTOption(ctx.author.id)
+        nftGroups = await dbInstance.getNFTGroupSummary(ctx.author.id)
     except Exception as e:
         loggingInstance.error(f"xrpIdNotFound")  if botVerbosity else None
         await ctx.send("xrpIdNotFound", ephemeral=True)
         return
     
     nftMenu = StringSelectMenu(
-        [StringSelectOption(label=key, value=key) for key in nftOptions.keys()],
+        [StringSelectOption(label=key, value=key) for key in nftGroups.keys()],
         custom_id='groupSelection',
         placeholder="NFT Group Selection",
     )
@@ -193,13 +220,18 @@ async def chooseNft(ctx: InteractionContext):
     
     page = 0
     items_per_page = 25
-    
-    def update_group_menu_options(nftOptions, chosen_group, page):
-        start = page * items_per_page
-        end = start + items_per_page
+    pageCursors = [None]
+    pageEntries = []
+    
+    # Only the shown page is loaded; the keyset cursor that starts each visited page is kept for Previous
+    async def update_group_menu_options(chosen_group, page):
+        nonlocal pageEntries
+        pageEntries, nextCursor = await dbInstance.getNFTGroupPage(ctx.author.id, chosen_group, pageCursors[page], items_per_page)
+        del pageCursors[page + 1:]
+        pageCursors.append(nextCursor) if nextCursor is not None else None
         group_options = [
-            StringSelectOption(label=item['label'], value=f"{start+index},{chosen_group}")
-            for index, item in enumerate(nftOptions[chosen_group][start:end])
+            StringSelectOption(label=item['label'], value=f"{index},{chosen_group}")
+            for index, item in enumerate(pageEntries)
         ]
         return group_options
     
@@ -208,7 +240,8 @@ async def chooseNft(ctx: InteractionContext):
     while component_result:
         if component_result.ctx.custom_id == 'groupSelection':
             chosen_group = component_result.ctx.values[0]
-            groupMenu.options = update_group_menu_options(nftOptions, chosen_group, page)
+            page = 0
+            groupMenu.options = await update_group_menu_options(chosen_group, page)
             groupMenu.disabled = False
             nftMenu.placeholder = chosen_group
             selectOne = ActionRow()
@@ -216,7 +249,7 @@ async def chooseNft(ctx: InteractionContext):
             selectOne.add_component(nftMenu)
             selectTwo.add_component(groupMenu)
             previous_button.disabled = True
-            next_button.disabled = len(nftOptions[chosen_group]) <= items_per_page
+            next_button.disabled = len(pageCursors) <= page + 1
             components = [selectOne, selectTwo]
             components.append(pagination_row) if not next_button.disabled else None
             latestMessage = await ctx.edit(content=f"Select NFT from {chosen_group} group", components=components)
@@ -232,7 +265,7 @@ async def chooseNft(ctx: InteractionContext):
                 await ctx.send("Error: Selected group not found", ephemeral=True)
                 return
 
-            chosen_nft = nftOptions[chosen_group][int(component_result.ctx.values[0].split(",")[0])]
+            chosen_nft = pageEntries[int(component_result.ctx.values[0].split(",")[0])]
             await dbInstance.setNFT(
                 xrpId=xrpId,
                 token=chosen_nft['tokenId'],
@@ -252,10 +285,10 @@ async def chooseNft(ctx: InteractionContext):
             return
         elif component_result.ctx.custom_id == 'previous':
             page -= 1
-            groupMenu.options = update_group_menu_options(nftOptions, chosen_group, page)
+            groupMenu.options = await update_group_menu_options(chosen_group, page)
             groupMenu.disabled = False
             previous_button.disabled = page == 0
-            next_button.disabled = False
+            next_button.disabled = len(pageCursors) <= page + 1
             
             components = latestMessage.components[0:-2]
             specificNFT = ActionRow()
@@ -269,11 +302,11 @@ async def chooseNft(ctx: InteractionContext):
         
         elif component_result.ctx.custom_id == 'next':
             page += 1
-            groupMenu.options = update_group_menu_options(nftOptions, chosen_group, page)
+            groupMenu.options = await update_group_menu_options(chosen_group, page)
             
             groupMenu.disabled = False
             previous_button.disabled = False
-            next_button.disabled = (page + 1) * items_per_page >= len(nftOptions[chosen_group])
+            next_button.disabled = len(pageCursors) <= page + 1
             
             components = latestMessage.components[0:-2]
             specificNFT = ActionRow()
@@ -472,6 +505,30 @@ async def getNFT(ctx: InteractionContext):
     await ctx.send(embed=embed, ephemeral=False)
     loggingInstance.info(f"/nft called by {ctx.author.display_name} success") if botVerbosity else None
     
+@slash_command(
+        name="battle-status",
+        description="See how many battles are running and queued")
+async def battleStatus(ctx: InteractionContext):
+    await ctx.defer(ephemeral=True, suppress_error=True)
+    status = battleScheduler.status()
+    
+    embed = Embed(title="Battle Royale Status", timestamp=datetime.now())
+    embed.add_field(name="Active Battles", value=f"{status['active']}/{status['maxBattles']}", inline=True)
+    embed.add_field(name="Queued", value=str(status['queued']), inline=True)
+    embed.add_field(name="In This Server", value=str(status['activeByGuild'].get(ctx.guild_id or 0, 0)), inline=True)
+    embed.add_field(name="Image/DB Work", value=f"{status['ioInUse']}/{status['ioLimit']}", inline=True)
+    
+    cacheStats = dbInstance.profileCache.stats()
+    embed.add_field(name="Profile Cache", value=f"{cacheStats['hitRate']:.0%} hits ({cacheStats['hits'] + cacheStats['coalesced']}/{cacheStats['hits'] + cacheStats['coalesced'] + cacheStats['misses']})", inline=True)
+    
+    imageStats = imageCache.stats()
+    embed.add_field(name="Image Cache", value=f"{imageStats['hitRate']:.0%} hits, {imageStats['bytes'] / 1048576:.0f} MB", inline=True)
+    
+    collageStats = collageRenderer.stats()
+    embed.add_field(name="Collages", value=f"{collageStats['running']} rendering, {collageStats['queued']} queued, p50 {collageStats['p50RenderMs']:.0f}ms, max {collageStats['maxUploadKB']:.0f} KB", inline=True)
+    
+    await ctx.send(embed=embed, ephemeral=True)
+
 @slash_command(
         name="br",
         description="BATTLE IT OUT!!",
@@ -502,6 +559,31 @@ async def battleRoyale(ctx: InteractionContext):
     await ctx.defer()  
     loggingInstance.info(f"/br called by {ctx.author.display_name}") if botVerbosity else None
     
+    # The join window does not hold a battle slot, the lobby only queues once it is closed
+    playersJoined = await openLobby(ctx)
+    if not playersJoined:
+        await ctx.send("No one answered the call!")
+        return
+    
+    ticket = battleScheduler.enqueue(ctx.guild_id)
+    try:
+        queueMessage = None
+        if ticket.position:
+            queueMessage = await ctx.send(f"Too many battles are running right now. Your battle is **#{ticket.position}** in the queue and will start automatically.")
+        
+        # A queue notice that cannot be edited is not worth losing the battle over
+        async def queueMoved(position: int):
+            try:
+                await queueMessage.edit(content=f"Too many battles are running right now. Your battle is **#{position}** in the queue and will start automatically.")
+            except Exception as e:
+                loggingInstance.error(f"Could not update queue position for guild {ctx.guild_id}: {e}")
+        
+        await ticket.wait(queueMoved if queueMessage is not None else None)
+        await runBattleRoyale(ctx, playersJoined)
+    finally:
+        battleScheduler.release(ticket)
+
+async def openLobby(ctx: InteractionContext) -> list[User]:
     wager = ctx.kwargs['wager']
     embed = Embed(title="XRPL Rainforest Battle Royale!!",
                       description=f"The Battle Royale Horn has sounded by XRPLRainforest Warriors!!\n\nClick the emoji below to answer the call for **__{wager} XRAIN.__**",
@@ -522,25 +604,31 @@ async def battleRoyale(ctx: InteractionContext):
     
     playersReactor = await battleCall.fetch_reaction(':crossed_swords:')
     loggingInstance.info(f"{len(playersReactor)} players attempted to join") if botVerbosity else None
-    playersJoined = [users for users in playersReactor if users.id != client.app.id]
+    return [users for users in playersReactor if users.id != client.app.id]
+
+async def runBattleRoyale(ctx: InteractionContext, playersJoined: list[User]):
+    wager = ctx.kwargs['wager']
+    battleInstance = Battle(quoteDeck)
+    loggingInstance.info(f"Battle seed: {battleInstance.seed}") if botVerbosity else None
+    
+    boostQuotes = []
     
-    battleInstance = Battle(dbInstance)
+    # One query for the whole lobby instead of a session per joiner
+    playerProfiles, profileErrors = await battleScheduler.runIO(lambda: dbInstance.getPlayerProfiles([user.id for user in playersJoined], wager))
     
-    boostQuotes = ""
+    # Joiners are built on one shared store rather than seven arrays each; Battle.join copies the
+    # accepted ones into the battle's store, and slots of rejected players go away with this store
+    lobbyStore = PlayerStore()
     
-    async def savePlayers(ctx: InteractionContext, users: User = None, wager = 0, npc = False):
+    async def savePlayers(ctx: InteractionContext, users: User = None, wager = 0, npc = False, npcProfile: dict = None, npcName = "XRAIN NPC Warrior"):
         try:
             if not npc:
-                playerInfo = await dbInstance.getNFTInfo(users.id)
+                if str(users.id) in profileErrors:
+                    raise Exception(profileErrors[str(users.id)])
                 
-                if playerInfo['nftLink'] == '':
-                    raise Exception("BattleNFTNotFound")
-                
-                if playerInfo['reserveXrain'] < wager:
-                    raise Exception("insufficientCredits")             
-                await dbInstance.placeWager(playerInfo['xrpId'], wager)
+                playerInfo = playerProfiles[str(users.id)]
             else:
-                playerInfo = await dbInstance.getNFTInfo(npc=npc)
+                playerInfo = npcProfile
         except Exception as e:
             match str(e):
                 case "xrpIdNotFound":
@@ -555,13 +643,10 @@ async def battleRoyale(ctx: InteractionContext):
             
             return None    
         
-        # Check for xrain for the wager
-        
-        totalBoost  = int(playerInfo['xrainPower']) * (2 if int(playerInfo['reserveBoosts']) > 0 else 1)
-            
+        # The boost multiplier is only applied once settleLobby has taken the boost
         playerInstance = Players(xrpId=playerInfo['xrpId'],
                                  wager=wager,
-                                 name=escapeMarkdown(users.display_name) if not npc else "XRAIN NPC Warrior",
+                                 name=users.display_name if not npc else npcName,
                                  discordId=users.id if not npc else 0,
                                  boosts=playerInfo['reserveBoosts'],
                                  battleWins=playerInfo['battleWins'],
@@ -570,84 +655,148 @@ async def battleRoyale(ctx: InteractionContext):
                                  taxonId=playerInfo['taxonId'],
                                  npc=playerInfo['npc'],
                                  mention=users.mention if not npc else None,
-                                 xrainPower=totalBoost)
+                                 xrainPower=playerInfo['xrainPower'],
+                                 store=lobbyStore)
+        
+        # NPCs are never settled, they fight with whatever boosts their profile has
+        playerInstance.setBoosted(int(playerInfo['reserveBoosts']) > 0) if npc else None
         
-        playerInstance.addNFTImage(await fetchImage(playerInstance.nftLink))
+        playerInstance.addNFTImage(await battleScheduler.runIO(lambda: imageCache.getThumbnail(playerInstance.nftLink)))
         
-        battleInstance.join(playerInstance)
+        return playerInstance
         
        
     coros = [savePlayers(ctx, user, wager) for user in playersJoined]
     
-    await gather(*coros)
+    joiners = [player for player in await gather(*coros) if player is not None]
+    
+    # All wagers and boosts of the lobby are settled in one transaction; a reserve spent meanwhile rejects the player
+    if joiners:
+        try:
+            accepted, rejected, boosted = await battleScheduler.runIO(lambda: dbInstance.settleLobby([player.xrpId for player in joiners],
+                                                                                           wager,
+                                                                                           [player.xrpId for player in joiners if player.boosts > 0]))
+        except Exception as e:
+            if str(e) != "LobbySettlementError":
+                raise
+            # The settlement transaction was rolled back, so no wager or boost was taken
+            loggingInstance.error(f"/br lobby of {len(joiners)} could not be settled, battle cancelled")
+            await ctx.channel.send("The battle could not be started because the wagers could not be settled. Nobody was charged, please try /br again.")
+            for message in splitMessage([f"{player.mention} " for player in joiners], MESSAGE_CONTENT_LIMIT):
+                await ctx.channel.send(message)
+            return
+        
+        boosted = set(boosted)
+        for player in joiners:
+            match rejected.get(player.xrpId):
+                case None:
+                    player.setBoosted(player.xrpId in boosted)
+                    battleInstance.join(player)
+                case "insufficientCredits":
+                    loggingInstance.error(f"{player.discordId} insufficient credit") if botVerbosity else None
+                    await ctx.channel.send(f"Insufficient  credits for {player.mention}. Please refill your XRAIN reserves")
+                case _:
+                    loggingInstance.error(f"xrpIdNotFound") if botVerbosity else None
+                    await ctx.channel.send(f"{player.mention}, not found. Please verify your wallet first via /battle-verify")
     
     if len(battleInstance.players) == 0:
         await ctx.send("No one answered the call!")
         return
-    elif len(battleInstance.players) == 1:
-        loggingInstance.info(f"Lone joiner, creating NPC") if botVerbosity else None
-        await savePlayers(ctx, wager=wager, npc=True)
-        await ctx.channel.send("A XRAIN NPC Warrior joined!")
+    
+    # Lobbies under min_players are filled with distinct NPCs drawn from the preloaded pool
+    npcNeeded = gameConfig.getint('min_players', fallback=2) - len(battleInstance.players)
+    if npcNeeded > 0:
+        loggingInstance.info(f"{len(battleInstance.players)} joined, creating {npcNeeded} NPC") if botVerbosity else None
+        try:
+            npcProfiles = npcPool.draw(npcNeeded)
+        except Exception as e:
+            loggingInstance.error(f"NPC draw failed: {e}")
+            npcProfiles = []
+        
+        npcPlayers = await gather(*[savePlayers(ctx,
+                                                wager=wager,
+                                                npc=True,
+                                                npcProfile=npcProfile,
+                                                npcName="XRAIN NPC Warrior" if len(npcProfiles) == 1 else f"XRAIN NPC Warrior #{number}")
+                                    for number, npcProfile in enumerate(npcProfiles, start=1)])
+        for npcPlayer in npcPlayers:
+            battleInstance.join(npcPlayer)
+        
+        if len(npcPlayers) == 1:
+            await ctx.channel.send("A XRAIN NPC Warrior joined!")
+        elif npcPlayers:
+            await ctx.channel.send(f"**{len(npcPlayers)}** XRAIN NPC Warriors joined!")
     
     for player in battleInstance.players:
         if player is None:
             continue 
         
         if player.boosts > 0:
-            boostQuotes += f"**{player.mention if player.mention is not None else player.name}** is **100% boosted** and ready!\n"
-            if not player.npc:
-                await dbInstance.claimBoost(player.xrpId)
+            boostQuotes.append(f"**{player.mention if player.mention is not None else escapeMarkdown(player.name)}** is **100% boosted** and ready!\n")
         else:
-            boostQuotes += f"**{player.mention if player.mention is not None else player.name}** is ready for the battle\n"
+            boostQuotes.append(f"**{player.mention if player.mention is not None else escapeMarkdown(player.name)}** is ready for the battle\n")
+    
+    for message in splitMessage(boostQuotes, MESSAGE_CONTENT_LIMIT):
+        await ctx.send(message)
     
-    await ctx.send(boostQuotes)
+    # Big lobbies are played as heats first; the heat winners fight the final shown round by round
+    bracketInstance = None
+    if len(battleInstance.players) > gameConfig.getint('bracket_threshold', fallback=100):
+        bracketInstance = Bracket(quoteDeck, battleInstance.players, seed=battleInstance.seed)
+        await ctx.channel.send(f"**{len(battleInstance.players)} warriors** answered the call! They are split into **{len(bracketInstance.heats)} heats** and the heat winners meet in the final.")
+        await postHeatResults(ctx.channel, await bracketInstance.runHeats())
+        battleInstance = bracketInstance.buildFinal()
+    
+    # Tiles are scaled once for the battle; later rounds only patch the players who fell or came back
+    collageAtlas = CollageAtlas(battleInstance.players)
     roundColor = await randomColor()
     roundNumber = 1
     await preRoundInfo(channel=ctx,
+                       collageAtlas=collageAtlas,
                        playerList=battleInstance.players,
                        roundNumber=roundNumber,
                        participantsNum=len(battleInstance.currentAlive),
                        deadNum=len(battleInstance.currentDead),
                        roundColor = roundColor)
-        
-    battleResults = await battleInstance.battle()
     
     async def randomWait():
         waitTime = max(random() * gameConfig.getfloat('max_wait'), gameConfig.getfloat('min_wait'))
         await sleep(waitTime)
     
+    await randomWait()
+    battleResults = await postRoundStream(ctx.channel, battleInstance, roundColor = roundColor)
+    
     while battleResults['winner'] is None:
-        await randomWait()
         loggingInstance.info(f"[Round {roundNumber}]: {battleResults['participantsNum']}/{len(battleInstance.players)} alive") if botVerbosity else None
-        await postRoundInfo(ctx.channel, battleResults, roundColor = roundColor)
         roundNumber += 1
         roundColor = await randomColor()
         await preRoundInfo(channel=ctx.channel,
+                           collageAtlas=collageAtlas,
                            playerList=battleResults['alive'],
                            roundNumber=roundNumber,
                            participantsNum=battleResults['participantsNum'],
                            deadNum=battleResults['deadNum'],
                            roundColor = roundColor)
-        battleResults = await battleInstance.battle()
         await randomWait()
+        battleResults = await postRoundStream(ctx.channel, battleInstance, roundColor = roundColor)
         
     loggingInstance.info(f"[Round {roundNumber}]: {battleResults['participantsNum']}/{len(battleInstance.players)} alive") if botVerbosity else None
-    await postRoundInfo(ctx.channel, battleResults, roundColor = roundColor)
     await randomWait()
-    mostKills, mostDeaths, mostRevives = await prepareStats(battleInstance.players)
+    statsStore, statsPlayers = bracketInstance.statsStore() if bracketInstance else (battleInstance.store, battleInstance.players)
+    mostKills, mostDeaths, mostRevives = await prepareStats(statsStore, statsPlayers)
     
     winnerEmbedColor = await randomColor()
     
     winnerImageEmbed = Embed(title="XRPLRainforest Battle Royale Winner", color=winnerEmbedColor)
     winnerImageEmbed.set_image(battleResults['winner'].nftLink)
     
-    winnerDescription = f"Congratulations **{battleResults['winner'].mention if not battleResults['winner'].npc else battleResults['winner'].name}** your NFT has won this Rainforest Battle."
+    winnerDescription = f"Congratulations **{battleResults['winner'].mention if not battleResults['winner'].npc else escapeMarkdown(battleResults['winner'].name)}** your NFT has won this Rainforest Battle."
     winnerDescription += f" **__{battleInstance.totalWager} XRAIN__** has been sent to you!!" if not battleResults['winner'].npc else ""
     winnerTextEmbed = Embed(description=winnerDescription, color=winnerEmbedColor)
     winnerTextEmbed.add_field(name="Kills",value=f":knife:{battleResults['winner'].kills}", inline=True)
     winnerTextEmbed.add_field(name="Revives",value=f":wing:{battleResults['winner'].reviveNum}", inline=True)
     
-    claimDescription = await dbInstance.getClaimQuote(battleResults['winner'].taxonId)
+    claimDescription = claimQuotePool.draw(battleResults['winner'].taxonId)
     claimEmbed = Embed(description=f"**{claimDescription['description']}**", color=winnerEmbedColor)
     
     statsEmbed = Embed(title="XRPL Rainforest Battle Royale Stats!",timestamp=datetime.now(), color=winnerEmbedColor)
@@ -656,7 +805,11 @@ async def battleRoyale(ctx: InteractionContext):
     statsEmbed.add_field(name="**Top 3 Revives**", value=mostRevives,inline=True)
     statsEmbed.set_footer("XRPLRainforest Battle Royale")    
     
-    await dbInstance.addWin(battleResults['winner'].xrpId, battleResults['winner'].NFT, battleResults['winner'].npc)
+    # Written with the next batch; main() drains the queue on shutdown
+    statWriter.addWin(battleResults['winner'].xrpId, battleResults['winner'].NFT, battleResults['winner'].npc)
+    archiveBattleLog(battleInstance)
+    for heat in bracketInstance.heats if bracketInstance else []:
+        archiveBattleLog(heat)
     
     await ctx.send(embeds=[winnerImageEmbed, claimEmbed, winnerTextEmbed, statsEmbed])
     
@@ -672,122 +825,162 @@ async def battleRoyale(ctx: InteractionContext):
     
     loggingInstance.info(f"/br success") if botVerbosity else None
         
-async def prepareStats(players: list[Players]):
+# Seed + event log is enough to replay or rerun the battle later (see components/battleLog.py)
+def archiveBattleLog(battleInstance: Battle):
+    logDir = gameConfig.get('battle_log_dir', fallback='battle-logs')
+    try:
+        os.makedirs(logDir, exist_ok=True)
+        with open(os.path.join(logDir, f"{datetime.now():%Y%m%d-%H%M%S}-{battleInstance.seed}.json"), 'w') as logFile:
+            logFile.write(battleInstance.log.serialize())
+    except OSError as e:
+        loggingInstance.error(f"archiveBattleLog({battleInstance.seed}): {e}")
+        
+async def prepareStats(store: PlayerStore, players: list[Players]):
     minRank = gameConfig.getint('stat_best_num')
-    mostKills = sorted(players, key=lambda players: players.kills, reverse=True)
+    
     killQuotes = ""
-    for player in mostKills[:minRank]:
-        killQuotes += f"**{player.name}**: {player.kills}\n"
+    for index in store.topIndices(store.kills, minRank):
+        killQuotes += f"{formatName(players[index].name)}: {store.kills[index]}\n"
         
-    mostDeaths = sorted(players, key=lambda players: players.deaths, reverse=True)
     deathQuotes = ""
-    for player in mostDeaths[:minRank]:
-        deathQuotes += f"**{player.name}**: {player.deaths}\n"
+    for index in store.topIndices(store.deaths, minRank):
+        deathQuotes += f"{formatName(players[index].name)}: {store.deaths[index]}\n"
     
-    mostRevives = sorted(players, key=lambda players: players.reviveNum, reverse=True)
     reviveQuotes = ""
-    for player in mostRevives[:minRank]:
-        reviveQuotes += f"**{player.name}**: {player.reviveNum}\n"
+    for index in store.topIndices(store.reviveNum, minRank):
+        reviveQuotes += f"{formatName(players[index].name)}: {store.reviveNum[index]}\n"
     
     return killQuotes, deathQuotes, reviveQuotes
     
 async def preRoundInfo(channel: InteractionContext.channel,
+                       collageAtlas: CollageAtlas,
                        playerList: list[Players],
                        roundNumber:int,
                        participantsNum:int,
                        deadNum:int,
                        roundColor: str):
     
-    descriptionText = '**Battle has started**\n\nParticipants: '
-    nftLinks = []
+    descriptionParts = ['**Battle has started**\n\nParticipants: ']
     for player in playerList:
-       descriptionText += f"{player.name}, "
-       nftLinks.append(player.nftImage)
+       descriptionParts.append(f"{escapeMarkdown(player.name)}, ")
+    descriptionText = "".join(descriptionParts)
         
     preRoundEmbed = Embed(title=f"ROUND {roundNumber}",
                           description=descriptionText, color=roundColor)
     
     preRoundEmbed.add_field(name="Participants", value=participantsNum, inline=True)
     preRoundEmbed.add_field(name="Dead", value=deadNum, inline=True)
-    collage = await create_collage(nftLinks)
-    
-    with BytesIO() as image_binary:
-        collage.save(image_binary, 'PNG')
-        image_binary.seek(0)
+    collage = await collageRenderer.renderRound(collageAtlas, playerList, label=f"round {roundNumber}")
+    
+    # A collage split for size goes out as one embed per part in the same message
+    fileNames = [f"collage{index or ''}.{collage.extension}" for index in range(len(collage.parts))]
+    files = [File(BytesIO(part), file_name=fileName) for part, fileName in zip(collage.parts, fileNames)]
+    preRoundEmbed.set_image(url=f"attachment://{fileNames[0]}")
+    embeds = [preRoundEmbed]
+    for fileName in fileNames[1:]:
+        partEmbed = Embed(color=roundColor)
+        partEmbed.set_image(url=f"attachment://{fileName}")
+        embeds.append(partEmbed)
+    
+    return await channel.send(embeds=embeds, files=files)
+    
+# Discord rejects embed descriptions and message contents longer than these
+EMBED_DESCRIPTION_LIMIT = 4096
+MESSAGE_CONTENT_LIMIT = 2000
+
+def splitMessage(parts: list[str], limit: int) -> list[str]:
+    messages = []
+    currentParts = []
+    currentLength = 0
+    for part in parts:
+        if currentParts and currentLength + len(part) > limit:
+            messages.append("".join(currentParts))
+            currentParts = []
+            currentLength = 0
+        currentParts.append(part)
+        currentLength += len(part)
+    if currentParts:
+        messages.append("".join(currentParts))
+    return messages
+
+async def postHeatResults(channel:InteractionContext.channel,
+                          heatResults: list[HeatResult]):
+    
+    heatColor = await randomColor()
+    resultParts = [
+        f"Heat {result.heatNumber}: {formatName(result.winner.name)} won with {result.winner.kills} kills "
+        f"in {result.rounds} rounds ({result.playerNum} warriors)\n"
+        for result in heatResults
+    ]
+    
+    for descriptionText in splitMessage(resultParts, EMBED_DESCRIPTION_LIMIT):
+        await channel.send(embed=Embed(title="Heat Results", description=descriptionText, color=heatColor))
+
+# Posts the round while it is being resolved: every time the description would overflow
+# an embed it is sent right away, and the last embed carries the round totals
+async def postRoundStream(channel:InteractionContext.channel,
+                          battleInstance: Battle,
+                          roundColor) -> dict:
+    
+    quotesList = []
+    descriptionParts = []
+    descriptionLength = 0
+    
+    # The first embed goes out after a few engagements or a short delay, whichever comes first, so players
+    # see the round start instead of waiting for a full embed; later ones are sent as they fill up
+    firstChunk = gameConfig.getint('stream_first_chunk', fallback=5)
+    firstDelay = gameConfig.getfloat('stream_first_delay', fallback=1.5)
+    firstSent = False
+    startTime = monotonic()
+    
+    async for quote in battleInstance.battleStream():
+        quotesList.append(quote)
+        if descriptionParts and descriptionLength + len(quote) + 2 > EMBED_DESCRIPTION_LIMIT:
+            await channel.send(embed=Embed(description="".join(descriptionParts), color=roundColor))
+            descriptionParts = []
+            descriptionLength = 0
+            firstSent = True
+        descriptionParts.append(quote)
+        descriptionParts.append("\n\n")
+        descriptionLength += len(quote) + 2
         
-        file =File(image_binary, file_name="collage.png")
-        preRoundEmbed.set_image(url="attachment://collage.png")
-        return await channel.send(embeds=[preRoundEmbed],file=file)
-    
+        if not firstSent and (len(quotesList) >= firstChunk or monotonic() - startTime >= firstDelay):
+            await channel.send(embed=Embed(description="".join(descriptionParts), color=roundColor))
+            descriptionParts = []
+            descriptionLength = 0
+            firstSent = True
+    
+    battleResults = battleInstance.roundResult(quotesList)
+    await postRoundInfo(channel, battleResults, roundColor, "".join(descriptionParts))
+    return battleResults
+
 async def postRoundInfo(channel:InteractionContext.channel,
                         battleResults,
-                        roundColor):
-    
-    descriptionText = ""
+                        roundColor,
+                        descriptionText = None):
     
-    for quote in battleResults['quotes']:
-        descriptionText += f"{quote}\n\n"
+    if descriptionText is None:
+        descriptionText = "".join(f"{quote}\n\n" for quote in battleResults['quotes'])
         
-    postRoundEmbed = Embed(description=descriptionText, color=roundColor)
+    # Everything may already have been streamed, an embed can carry just the fields
+    postRoundEmbed = Embed(description=descriptionText or None, color=roundColor)
     
     postRoundEmbed.add_field(name="Participants", value=battleResults['participantsNum'], inline=True)
     postRoundEmbed.add_field(name="Dead", value=battleResults['deadNum'], inline=True)
     
     await channel.send(embed=postRoundEmbed )  
         
-async def fetchImage(url):
-    response = requests.get(url)
-    return Image.open(BytesIO(response.content))
-    
-async def create_collage(images):
-    possibleEntryPerRow = [1,2,3,4,5]
-    remainderResult = {}
-    
-    for entry in possibleEntryPerRow:
-        currentRemainder = len(images) % entry
-        
-        # print(f"{currentRemainder} in {remainderResult.keys()}")
-        if currentRemainder in remainderResult.keys():
-            currentEntry = remainderResult[currentRemainder]
-            remainderResult[currentRemainder] = currentEntry if currentEntry > entry else entry
-            
-            # print(f"{remainderResult[currentRemainder]} = {currentEntry} > {entry}")
-            
-            continue
-        
-        remainderResult[currentRemainder] = entry
-        
-    sortedResultKey = list(remainderResult.keys())
-    sortedResultKey.sort()
-    minKey = sortedResultKey[0]
-    maxImagePerRow = remainderResult[minKey]
-    if maxImagePerRow == 1 and not len(images) == 1:
-        maxImagePerRow = remainderResult[sortedResultKey[1]]
-    # print(remainderResult[minKey], remainderResult)
-    
-    # Find the minimum width and height among all images
-    min_width = min(img.width for img in images)
-    min_height = min(img.height for img in images)
-    
-    # Resize all images to the minimum width and height
-    resized_images = [img.resize((min_width, min_height), Image.Resampling.LANCZOS) for img in images]
-    
-    # Calculate the number of rows
-    rows = (len(images) + maxImagePerRow - 1) // maxImagePerRow
-    
-    collage_width = min_width * maxImagePerRow
-    collage_height = min_height * rows
-    
-    collage = Image.new('RGBA', (collage_width, collage_height), (0, 0, 0, 0))
-    
-    for idx, img in enumerate(resized_images):
-        row = idx // maxImagePerRow
-        col = idx % maxImagePerRow
-        x_offset = col * min_width
-        y_offset = row * min_height
-        collage.paste(img, (x_offset, y_offset))
-    
-    return collage
+async def main():
+    try:
+        await client.astart()
+    finally:
+        await statWriter.stop()
+        await imageCache.close()
+        await imageFetcher.close()
+        collageRenderer.shutdown()
+        dbInstance.queryStats.stopSummaryLog()
+        loggingInstance.info(f"DB stats: {dbInstance.queryStats.summary()}")
+        await dbInstance.dbEngine.dispose()
 
 if __name__ == "__main__":
-    client.start()
+    run(main())
@@ -0,0 +1,80 @@
+from components.players import Players, PlayerStore
+from argparse import ArgumentParser
+import tracemalloc
+
+
+# Players as it was before the PlayerStore backend, kept here as the baseline
+class LegacyPlayers:
+    def __init__(self, xrpId, wager, name, discordId, battleWins, tokenId, boosts:int = 0, xrainPower:int = 0, nftLink = "", taxonId = 0, npc = False, mention = ""):
+        self.xrpId = xrpId
+        self.wager = wager
+        self.name = name
+        self.discordId = discordId
+        self.alive = True
+        self.reviveNum = 0
+        self.battleWins = battleWins
+        self.NFT = tokenId
+        self.boosts = boosts
+        self.xrainPower = xrainPower
+        self.kills = 0
+        self.nftLink = nftLink
+        self.deaths = 0
+        self.taxonId = taxonId
+        self.npc = npc
+        self.mention = mention
+
+
+# Memory still held once build() returns, and the peak reached while it ran
+def measure(build) -> tuple[int, int]:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    players = build()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del players
+    return after - before, peak - before
+
+
+def main():
+    parser = ArgumentParser(description="Per-player memory of Players before and after the PlayerStore backend")
+    parser.add_argument("--players", type=int, nargs="+", default=[500, 1000, 2000])
+    args = parser.parse_args()
+
+    for playerNum in args.players:
+        # Identity strings are built up front and shared, so only the per-player containers are measured.
+        # Stats are created inside each build, the way fresh DB values arrive for every lobby
+        fields = [
+            (f"r{index:033d}", f"Warrior {index}", 10**17 + index, f"{index:064X}",
+             f"https://ipfs.io/ipfs/{index:046d}", f"<@{10**17 + index}>")
+            for index in range(playerNum)
+        ]
+
+        legacyBytes, legacyPeak = measure(lambda: [
+            LegacyPlayers(xrpId, 50, name, discordId, 300 + index % 120, tokenId, index % 3, 1000 + index * 7, nftLink, 0, False, mention)
+            for index, (xrpId, name, discordId, tokenId, nftLink, mention) in enumerate(fields)
+        ])
+
+        # The path /br takes: savePlayers builds every joiner on the lobby's store, then Battle.join
+        # adopts each one into the battle's store and the lobby store is freed
+        def buildCompact():
+            lobbyStore = PlayerStore()
+            players = [
+                Players(xrpId, 50, name, discordId, 300 + index % 120, tokenId, index % 3, 1000 + index * 7, nftLink, 0, False, mention, store=lobbyStore)
+                for index, (xrpId, name, discordId, tokenId, nftLink, mention) in enumerate(fields)
+            ]
+            del lobbyStore
+            store = PlayerStore()
+            for player in players:
+                store.adopt(player)
+            return store, players
+
+        compactBytes, compactPeak = measure(buildCompact)
+
+        print(f"{playerNum:>6} players | legacy {legacyBytes / playerNum:7.1f} B/player (peak {legacyPeak / playerNum:7.1f}) | "
+              f"compact {compactBytes / playerNum:7.1f} B/player (peak {compactPeak / playerNum:7.1f}) | "
+              f"saved {(1 - compactBytes / legacyBytes) * 100:5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+from database.db import BattleRoyaleDB
+from database.schema import SchemaVerifier
+from asyncio import run
+from argparse import ArgumentParser
+
+parser = ArgumentParser(description="Check the live tables against the indexes the bot's queries need")
+parser.add_argument("--apply", action="store_true", help="Create the missing indexes")
+parser.add_argument("--no-explain", action="store_true", help="Skip the EXPLAIN of the hot queries")
+parser.add_argument("--ddl-file", default=None, help="Write the missing index DDL to this file instead of printing it")
+
+
+async def main():
+    args = parser.parse_args()
+
+    dbInstance = BattleRoyaleDB.fromConfig()
+    verifier = SchemaVerifier(dbInstance.dbEngine)
+    report = await verifier.verify(explain=not args.no_explain)
+
+    for tableName in report.missingTables:
+        print(f"Missing table: {tableName}")
+
+    if args.ddl_file:
+        with open(args.ddl_file, "w") as ddlFile:
+            ddlFile.write("\n".join(report.ddl) + "\n")
+        print(f"{len(report.ddl)} statements written to {args.ddl_file}")
+    else:
+        for ddl in report.ddl:
+            print(ddl)
+
+    # The plans are checked again once the new indexes exist
+    if args.apply and report.missingIndexes:
+        print(f"Created {await verifier.apply(report)} indexes")
+        report = await verifier.verify(explain=not args.no_explain)
+
+    for name, scans in report.fullScans.items():
+        print(f"Full scan in {name}: {', '.join(scans)}")
+
+    print("Schema OK" if report.healthy else "Schema needs attention")
+    await dbInstance.dbEngine.dispose()
+
+
+if __name__ == "__main__":
+    run(main())
@@ -0,0 +1,136 @@
+from database.db import BattleRoyaleDB
+from database.models import BattleQuotes, NFTTraitList, RewardsTable, ClaimQuotes
+from components.battleLog import EVENT_CATEGORIES
+from asyncio import run
+from argparse import ArgumentParser
+from random import Random
+from time import perf_counter
+
+from sqlalchemy import VARCHAR, insert
+from sqlalchemy.ext.compiler import compiles
+
+parser = ArgumentParser(description="Create the four bot tables and fill them with synthetic data for load tests")
+parser.add_argument("--backend", default=None, help="mysql or sqlite, defaults to DATABASE db_backend")
+parser.add_argument("--sqlite-path", default=None, help="Defaults to DATABASE sqlite_path")
+parser.add_argument("--players", type=int, default=1000, help="Wallets in the rewards table")
+parser.add_argument("--nfts-per-player", type=int, default=8, help="Average NFTs owned per wallet")
+parser.add_argument("--npcs", type=int, default=10)
+parser.add_argument("--quotes-per-category", type=int, default=25)
+parser.add_argument("--claim-quotes-per-taxon", type=int, default=5)
+parser.add_argument("--batch-size", type=int, default=2000, help="Rows per INSERT")
+parser.add_argument("--reset", action="store_true", help="Drop the tables first")
+parser.add_argument("--seed", type=int, default=1)
+
+NFT_GROUPS = {0: "Rainforest Warriors", 1: "Parrot Guard", 2: "Jungle Lords", 3: "River Spirits", 4: "Canopy Rangers"}
+BASE58 = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+QUOTE_SHAPES = {
+    "High Rank Kill": "$Player1 outranks $Player2 and ends the duel with a {verb}",
+    "High XRAIN Kill": "$Player1 pours XRAIN into a {verb} that $Player2 cannot survive",
+    "Low XRAIN Kill": "Low on XRAIN, $Player1 still lands a {verb} on $Player2",
+    "Normal Kill": "$Player1 catches $Player2 off guard with a {verb}",
+    "Neutral": "$Player1 practises a {verb} alone in the canopy",
+    "Revival": "$Player1 is pulled back from the forest floor by a {verb}",
+}
+VERBS = ["vine whip", "falling coconut", "river ambush", "parrot swarm", "thunder strike", "mud trap", "jaguar leap"]
+
+
+# The models leave VARCHAR lengths to the existing MySQL tables; tables created here get 255
+@compiles(VARCHAR, "mysql")
+def compileVarchar(type_, compiler, **kwargs):
+    return f"VARCHAR({type_.length or 255})"
+
+
+def xrpAddress(rng: Random) -> str:
+    return "r" + "".join(rng.choice(BASE58) for _ in range(33))
+
+
+def buildRows(args, rng: Random) -> dict:
+    rewards = []
+    nfts = []
+    tokenCount = 0
+
+    for index in range(args.players + args.npcs):
+        npc = index >= args.players
+        xrpId = f"npcPlayer{index - args.players}" if npc else xrpAddress(rng)
+        # Battle records are heavy tailed: most wallets have a few wins, a handful have hundreds
+        battleWins = min(int(rng.paretovariate(1.3)) - 1, 400)
+        owned = 1 if npc else max(0, int(rng.expovariate(1 / args.nfts_per_player)))
+
+        ownedNfts = []
+        for _ in range(owned):
+            tokenCount += 1
+            taxonId = rng.choice(list(NFT_GROUPS))
+            tokenId = f"{rng.getrandbits(256):064X}"
+            totalXrain = int(rng.lognormvariate(6, 0.8))
+            ownedNfts.append((tokenId, taxonId, totalXrain))
+            nfts.append({
+                "uri": f"ipfs://seed/{tokenCount}",
+                "tokenId": tokenId,
+                "nftGroupName": NFT_GROUPS[taxonId],
+                "taxonId": taxonId,
+                "xrpId": xrpId,
+                "nftlink": f"https://ipfs.io/ipfs/seed{tokenCount}.png",
+                "totalXRAIN": totalXrain,
+                "battleWins": 0,
+            })
+
+        battleNft = rng.choice(ownedNfts) if ownedNfts and (npc or rng.random() < 0.8) else None
+        rewards.append({
+            "xrpId": xrpId,
+            "discordId": "" if npc or rng.random() < 0.1 else str(10**17 + rng.getrandbits(59)),
+            "tokenIdBattleNFT": battleNft[0] if battleNft else "",
+            "nftlink": f"https://ipfs.io/ipfs/{battleNft[0][:16]}.png" if battleNft else "",
+            "taxonId": battleNft[1] if battleNft else 0,
+            "nftGroupName": NFT_GROUPS[battleNft[1]] if battleNft else "",
+            "xrainPower": battleNft[2] if battleNft else 0,
+            "reserveXRAIN": rng.choice([0, 25, 50, 100, 250, 1000, 5000]),
+            "reserveBoosts": rng.choice([0, 0, 0, 1, 2, 5]),
+            "battleWins": battleWins,
+        })
+
+    quotes = [
+        {"quoteId": quoteId, "quoteType": category, "quoteDesc": QUOTE_SHAPES[category].format(verb=rng.choice(VERBS))}
+        for quoteId, category in enumerate(
+            [category for category in EVENT_CATEGORIES for _ in range(args.quotes_per_category)], start=1
+        )
+    ]
+
+    claimQuotes = [
+        {"quoteId": quoteId, "nftGroupName": NFT_GROUPS[taxonId], "taxonId": taxonId,
+         "description": f"The {NFT_GROUPS[taxonId]} claim the forest with a {rng.choice(VERBS)}!"}
+        for quoteId, taxonId in enumerate(
+            [taxonId for taxonId in NFT_GROUPS for _ in range(args.claim_quotes_per_taxon)], start=1
+        )
+    ]
+
+    return {RewardsTable: rewards, NFTTraitList: nfts, BattleQuotes: quotes, ClaimQuotes: claimQuotes}
+
+
+async def main():
+    args = parser.parse_args()
+    rng = Random(args.seed)
+
+    dbInstance = BattleRoyaleDB.fromConfig(backend=args.backend, sqlitePath=args.sqlite_path)
+
+    # Every model has its own declarative Base, so each metadata is created separately
+    async with dbInstance.dbEngine.begin() as connection:
+        for model in (RewardsTable, NFTTraitList, BattleQuotes, ClaimQuotes):
+            if args.reset:
+                await connection.run_sync(model.__table__.drop, checkfirst=True)
+            await connection.run_sync(model.metadata.create_all)
+
+    start = perf_counter()
+    for model, rows in buildRows(args, rng).items():
+        async with dbInstance.asyncSessionMaker() as session:
+            async with session.begin():
+                for offset in range(0, len(rows), args.batch_size):
+                    await session.execute(insert(model), rows[offset:offset + args.batch_size])
+        print(f"{model.__table__.name}: {len(rows)} rows")
+
+    print(f"Seeded in {perf_counter() - start:.1f}s")
+    await dbInstance.dbEngine.dispose()
+
+
+if __name__ == "__main__":
+    run(main())